@@ -0,0 +1,148 @@
+"""Benchmark get_reddits end to end against the local replay server.
+
+Every combination of subreddit count and depth is crawled through
+benchmarks.replay.ReplayServer, reporting throughput, page latency
+percentiles, CPU time and peak memory. No network access is needed.
+
+Usage: python -m benchmarks.crawl [--subreddits 1 10 50] [--depths 1 6]
+           [--latency 0.05] [--jitter 0.02] [--error-rate 0]
+           [--concurrency 16] [--parser html.parser] [--top day]
+           [--backend html] [--batch-size 1]
+"""
+import argparse
+import itertools
+import time
+import tracemalloc
+from unittest import mock
+
+from benchmarks import replay
+from reddit import utils
+
+SUBREDDIT_COUNTS = (1, 10, 50)
+DEPTHS = (1, 3, 6)
+
+
+def get_percentile(values, percentile):
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+def run(server, subreddit_count, depth, **options):
+    """Crawl subreddit_count subreddits of the replay server.
+
+    :return: Dict with the measures of the run.
+    :rtype: dict
+    """
+    latencies = []
+    request_url = utils._request_url
+
+    async def timed_request_url(fetcher, url):
+        started_at = time.perf_counter()
+        try:
+            return await request_url(fetcher, url)
+        finally:
+            latencies.append(time.perf_counter() - started_at)
+
+    stream = utils.fetch.Fetcher.stream
+
+    async def timed_stream(fetcher, url, *args):
+        started_at = time.perf_counter()
+        try:
+            async for chunk in stream(fetcher, url, *args):
+                yield chunk
+        finally:
+            latencies.append(time.perf_counter() - started_at)
+
+    subreddit_names = ';'.join(
+        f'sub{index}' for index in range(subreddit_count))
+
+    tracemalloc.start()
+    started_at, cpu_started_at = time.perf_counter(), time.process_time()
+
+    with mock.patch.object(utils, 'BASE_URL', server.url), \
+            mock.patch.object(utils, '_request_url', timed_request_url), \
+            mock.patch.object(utils.fetch.Fetcher, 'stream', timed_stream):
+        threads = utils.get_reddits(
+            subreddit_names, min_upvotes=0, depth=depth, cache=None, rate=0,
+            **options)
+
+    elapsed = time.perf_counter() - started_at
+    cpu_time = time.process_time() - cpu_started_at
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'pages': len(latencies),
+        'threads': len(threads),
+        'seconds': elapsed,
+        'pages_per_second': len(latencies) / elapsed,
+        'p50': get_percentile(latencies, 0.50),
+        'p95': get_percentile(latencies, 0.95),
+        'p99': get_percentile(latencies, 0.99),
+        'cpu_seconds': cpu_time,
+        'peak_memory_mb': peak_memory / 1024 / 1024,
+    }
+
+
+def main(subreddit_counts, depths, latency, jitter, error_rate, **options):
+    print(f'{"subs":>5} {"depth":>5} {"pages":>6} {"threads":>8} '
+          f'{"time (s)":>9} {"pages/s":>8} {"p50 (ms)":>9} '
+          f'{"p95 (ms)":>9} {"p99 (ms)":>9} {"cpu (s)":>8} '
+          f'{"peak (MB)":>10}')
+
+    with replay.ReplayServer(latency, jitter, error_rate) as server:
+        for subreddit_count, depth in itertools.product(
+                subreddit_counts, depths):
+            result = run(server, subreddit_count, depth, **options)
+            print(
+                f'{subreddit_count:>5} {depth:>5} {result["pages"]:>6} '
+                f'{result["threads"]:>8} {result["seconds"]:>9.3f} '
+                f'{result["pages_per_second"]:>8.1f} '
+                f'{result["p50"] * 1000:>9.1f} '
+                f'{result["p95"] * 1000:>9.1f} '
+                f'{result["p99"] * 1000:>9.1f} '
+                f'{result["cpu_seconds"]:>8.3f} '
+                f'{result["peak_memory_mb"]:>10.1f}'
+            )
+
+        print(f'Server: {server.requests} requests, '
+              f'{server.errors} injected errors.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--subreddits', type=int, nargs='+',
+                        default=SUBREDDIT_COUNTS)
+    parser.add_argument('--depths', type=int, nargs='+', default=DEPTHS)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int,
+                        default=utils.fetch.DEFAULT_CONCURRENCY)
+    parser.add_argument('--parser', default=utils.DEFAULT_PARSER,
+                        choices=sorted(utils.PARSERS))
+    parser.add_argument('--top', choices=utils.TOP_PERIODS)
+    parser.add_argument('--backend', default=utils.DEFAULT_BACKEND,
+                        choices=sorted(utils.BACKENDS))
+    parser.add_argument('--batch-size', type=int,
+                        default=utils.DEFAULT_BATCH_SIZE)
+    arguments = parser.parse_args()
+
+    main(
+        arguments.subreddits,
+        arguments.depths,
+        arguments.latency,
+        arguments.jitter,
+        arguments.error_rate,
+        concurrency=arguments.concurrency,
+        parser=arguments.parser,
+        top=arguments.top,
+        backend=arguments.backend,
+        batch_size=arguments.batch_size,
+    )
@@ -0,0 +1,89 @@
+"""Measure the startup time of the crawler modules, CLI and bot app.
+
+Every target runs in a fresh interpreter, so nothing is already imported.
+Module targets report the import time alone, while command targets
+report the whole process time, interpreter startup included.
+
+Usage: python -m benchmarks.imports [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_TARGETS = (
+    ('reddit', 'import reddit'),
+    ('reddit.utils', 'import reddit.utils'),
+    ('reddit.fetch', 'import reddit.fetch'),
+    ('reddit.telegram', 'import reddit.telegram'),
+    ('create_app()', 'import reddit; reddit.create_app()'),
+)
+COMMAND_TARGETS = (
+    ('python -c pass', ['-c', 'pass']),
+    ('python reddit --help', ['reddit', '--help']),
+)
+TIMER = '''
+import time
+started_at = time.perf_counter()
+{code}
+print(time.perf_counter() - started_at)
+'''
+
+
+def _get_env():
+    env = dict(os.environ)
+    env.setdefault('BOT_TOKEN', 'benchmark')
+    return env
+
+
+def time_import(code, runs):
+    """Return the import times of code, each run in a new interpreter.
+
+    :return: List of seconds.
+    :rtype: list
+    """
+    return [
+        float(subprocess.check_output(
+            [sys.executable, '-c', TIMER.format(code=code)], env=_get_env()))
+        for _ in range(runs)
+    ]
+
+
+def time_command(arguments, runs):
+    """Return the wall times of a python command.
+
+    :return: List of seconds.
+    :rtype: list
+    """
+    seconds = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, env=_get_env(),
+                       stdout=subprocess.DEVNULL, check=True)
+        seconds.append(time.perf_counter() - started_at)
+    return seconds
+
+
+def main(runs):
+    print(f'{"target":<24} {"median (ms)":>12} {"min (ms)":>9}')
+
+    results = [
+        (name, time_import(code, runs)) for name, code in IMPORT_TARGETS
+    ] + [
+        (name, time_command(arguments, runs))
+        for name, arguments in COMMAND_TARGETS
+    ]
+    for name, seconds in results:
+        print(f'{name:<24} {statistics.median(seconds) * 1000:>12.1f} '
+              f'{min(seconds) * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the startup time of the crawler.')
+    parser.add_argument('--runs', type=int, default=10)
+    arguments = parser.parse_args()
+
+    main(arguments.runs)
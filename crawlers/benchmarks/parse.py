@@ -0,0 +1,77 @@
+"""Measure how page parsing throughput scales with parse processes.
+
+Synthetic listing pages (benchmarks.replay.make_page) are parsed with
+utils._parse_content, in process and by process pools of several sizes,
+the same way the crawl pipeline sends raw page bytes to its pool.
+
+Usage: python -m benchmarks.parse [--pages 400] [--workers 1 2 4 8]
+           [--parser html.parser]
+"""
+import argparse
+import concurrent.futures
+import functools
+import os
+import time
+
+from benchmarks import replay
+from reddit import utils
+
+
+def _get_workers():
+    workers, count = [], 1
+    while count < (os.cpu_count() or 1):
+        workers.append(count)
+        count *= 2
+    return workers + [os.cpu_count() or 1]
+
+
+def run(pages, workers, parser):
+    """Parse pages returning the elapsed seconds."""
+    parse = functools.partial(utils._parse_content, parser=parser)
+    urls = [''] * len(pages)
+
+    started_at = time.perf_counter()
+    if workers == 1:
+        results = list(map(parse, pages, urls))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(
+                parse, pages, urls,
+                chunksize=max(1, len(pages) // (workers * 4))))
+    elapsed = time.perf_counter() - started_at
+
+    assert len(results) == len(pages)
+    return elapsed
+
+
+def main(page_count, workers, parser):
+    pages = [
+        replay.make_page(f'sub{index % 20}', index % 6)
+        for index in range(page_count)
+    ]
+
+    print(f'{page_count} pages, {parser} parser, '
+          f'{os.cpu_count()} cores')
+    print(f'{"workers":>8} {"time (s)":>9} {"pages/s":>8} {"speedup":>8}')
+
+    baseline = None
+    for count in workers:
+        elapsed = run(pages, count, parser)
+        baseline = baseline or elapsed
+        print(f'{count:>8} {elapsed:>9.3f} {page_count / elapsed:>8.1f} '
+              f'{baseline / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    argument_parser.add_argument('--pages', type=int, default=400)
+    argument_parser.add_argument('--workers', type=int, nargs='+',
+                                 default=_get_workers())
+    argument_parser.add_argument('--parser', default=utils.DEFAULT_PARSER,
+                                 choices=sorted(utils.PARSERS))
+    arguments = argument_parser.parse_args()
+
+    main(arguments.pages, arguments.workers, arguments.parser)
@@ -0,0 +1,309 @@
+"""Local stand-in of old.reddit.com serving recorded listing pages.
+
+Record real listing pages into fixtures (needs network access):
+
+    python -m benchmarks.replay record cats;dogs [--depth 6]
+
+Pages are saved as benchmarks/fixtures/<subreddit>/<page>.html with their
+next-button pointing to "?page=<next page>". Subreddits without fixtures
+are served synthetic pages with the same markup, so benchmarks also run
+without any recording. Top (/top/) and JSON (.json) listings and combined
+/r/a+b/ listings are served synthetic pages.
+"""
+import argparse
+import asyncio
+import html
+import json
+import os
+import random
+import re
+import threading
+import urllib.parse
+
+import requests
+from aiohttp import web
+
+from reddit import utils
+
+FIXTURES_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fixtures'
+)
+RECORDED_URL = 'https://old.reddit.com'
+THREADS_PER_PAGE = 25
+NEXT_BUTTON = re.compile(
+    rb'(<span class="next-button"><a href=")[^"]*(")'
+)
+
+THING = (
+    '<div class=" thing id-t3_{id} link " data-fullname="t3_{id}" '
+    'data-url="{url}" data-score="{score}" data-subreddit="{subreddit}" '
+    'data-permalink="/r/{subreddit}/comments/{id}/thread_{id}/">'
+    '<p class="title"><a class="title may-blank " href="{url}">'
+    'Thread {id} of {subreddit}</a></p>'
+    '<ul class="flat-list buttons"><li class="first">'
+    '<a href="/r/{subreddit}/comments/{id}/">{comments} comments</a></li>'
+    '</ul></div>'
+)
+PAGE = (
+    '<html><head><title>{subreddit}</title></head><body>'
+    '<div class="side"><div class="md">{sidebar}</div></div>'
+    '<div id="siteTable">{things}'
+    '<div class="nav-buttons"><span class="nextprev">view more: '
+    '<span class="next-button"><a href="{next_url}">next ›</a></span>'
+    '</span></div></div></body></html>'
+)
+
+
+def get_page_path(subreddit_name, page_number):
+    return os.path.join(
+        FIXTURES_DIRECTORY, subreddit_name.lower(), f'{page_number}.html'
+    )
+
+
+def _get_next_url(subreddit_name, page_number):
+    return f'{RECORDED_URL}/r/{subreddit_name}/?page={page_number + 1}'
+
+
+def _make_threads(subreddit_name, page_number):
+    """Build the synthetic threads of a listing page.
+
+    Combined listings (a+b) rank the threads of every subreddit by score,
+    keeping THREADS_PER_PAGE of them.
+
+    :param subreddit_name: Subreddit name, or names joined by "+".
+    :type subreddit_name: str
+    :param page_number: Page number, starting at 0.
+    :type page_number: int
+    :return: List of thread dicts.
+    :rtype: list
+    """
+    threads = []
+    for name in subreddit_name.split('+'):
+        generator = random.Random(f'{name}{page_number}')
+        for index in range(THREADS_PER_PAGE):
+            thread_id = f'{name.lower()}{page_number}x{index}'
+            threads.append({
+                'id': thread_id,
+                'subreddit': name,
+                'url': f'https://i.example.com/{name}/{thread_id}.jpg',
+                'score': generator.randint(0, 20000 // (page_number + 1)),
+                'comments': generator.randint(0, 1000),
+            })
+
+    if '+' in subreddit_name:
+        threads.sort(key=lambda thread: -thread['score'])
+    return threads[:THREADS_PER_PAGE]
+
+
+def make_page(subreddit_name, page_number):
+    """Build a synthetic listing page with the markup of old.reddit.com.
+
+    Scores decrease along pages, like in the top listing.
+
+    :param subreddit_name: Subreddit name, or names joined by "+".
+    :type subreddit_name: str
+    :param page_number: Page number, starting at 0.
+    :type page_number: int
+    :return: Page content.
+    :rtype: bytes
+    """
+    return PAGE.format(
+        subreddit=subreddit_name,
+        sidebar='<p>sidebar</p>' * 200,
+        things=''.join(
+            THING.format(**thread)
+            for thread in _make_threads(subreddit_name, page_number)
+        ),
+        next_url=_get_next_url(subreddit_name, page_number),
+    ).encode()
+
+
+def make_json_page(subreddit_name, page_number):
+    """Build a synthetic JSON listing page with the shape of reddit.com.
+
+    :param subreddit_name: Subreddit name, or names joined by "+".
+    :type subreddit_name: str
+    :param page_number: Page number, starting at 0.
+    :type page_number: int
+    :return: Page content.
+    :rtype: bytes
+    """
+    return json.dumps({'data': {
+        'after': str(page_number + 1),
+        'children': [
+            {'data': {
+                'title': f'Thread {thread["id"]} of {thread["subreddit"]}',
+                'url': thread['url'],
+                'is_self': False,
+                'score': thread['score'],
+                'num_comments': thread['comments'],
+                'permalink': f'/r/{thread["subreddit"]}/comments/'
+                             f'{thread["id"]}/thread_{thread["id"]}/',
+                'subreddit': thread['subreddit'],
+            }}
+            for thread in _make_threads(subreddit_name, page_number)
+        ],
+    }}).encode()
+
+
+def load_page(subreddit_name, page_number):
+    """Return the recorded page, or a synthetic one without fixture."""
+    try:
+        with open(get_page_path(subreddit_name, page_number), 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return make_page(subreddit_name, page_number)
+
+
+def _replace_next_url(content, request, page_number):
+    """Point the next-button of a page to the next page of the request.
+
+    Keeps the listing path and query, like the top period, of requests.
+    """
+    query = dict(request.query, page=str(page_number + 1))
+    next_url = f'{RECORDED_URL}{request.path}?' \
+               f'{urllib.parse.urlencode(query)}'
+    return NEXT_BUTTON.sub(
+        rb'\g<1>' + html.escape(next_url).encode() + rb'\g<2>', content)
+
+
+class ReplayServer:
+    """HTTP server replaying listing pages in a background thread.
+
+    Absolute old.reddit.com urls of the pages are rewritten to the server
+    url, so crawlers using it as utils.BASE_URL never leave the machine.
+    Subreddits without fixtures get synthetic pages, like top, JSON and
+    combined listings.
+
+    :param latency: Mean seconds before each response.
+    :type latency: float
+    :param jitter: Max seconds randomly added to or removed from latency.
+    :type jitter: float
+    :param error_rate: Ratio of responses replaced by a 503 error.
+    :type error_rate: float
+    :param seed: Seed of the latency and error generator.
+    :type seed: int
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.url = None
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    async def _handle(self, request):
+        self.requests += 1
+
+        delay = self.latency + self._random.uniform(-self.jitter,
+                                                    self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503)
+
+        subreddit_name = request.match_info['subreddit']
+        page_number = int(
+            request.query.get('page', request.query.get('after', 0)))
+
+        if request.path.endswith('.json'):
+            content = make_json_page(subreddit_name, page_number)
+            content_type = 'application/json'
+        else:
+            if '+' in subreddit_name or '/top/' in request.path:
+                content = make_page(subreddit_name, page_number)
+            else:
+                content = load_page(subreddit_name, page_number)
+            content = _replace_next_url(
+                content, request, page_number).replace(
+                RECORDED_URL.encode(), self.url.encode())
+            content_type = 'text/html'
+
+        return web.Response(body=content, content_type=content_type)
+
+    async def _start(self):
+        app = web.Application()
+        for path in ('/r/{subreddit}/', '/r/{subreddit}/top/',
+                     '/r/{subreddit}/.json', '/r/{subreddit}/top/.json'):
+            app.router.add_get(path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}'
+
+    def __enter__(self):
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(
+            self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def record(subreddit_names, depth=utils.DEFAULT_DEPTH):
+    """Download listing pages of old.reddit.com into fixtures.
+
+    :param subreddit_names: Name of subbreddits separated by ";".
+    :type subreddit_names: str
+    :param depth: Number of pages of each subreddit.
+    :type depth: int
+    """
+    for subreddit_name in utils._split_subreddit_names(subreddit_names):
+        url = f'{RECORDED_URL}/r/{subreddit_name}/'
+        for page_number in range(depth):
+            response = requests.get(url, headers=utils.HEADERS, timeout=30)
+            response.raise_for_status()
+
+            soup = utils._make_soup(response.content)
+            url = utils._parse_next_page_url(soup, url)
+
+            path = get_page_path(subreddit_name, page_number)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(NEXT_BUTTON.sub(
+                    rb'\g<1>' + _get_next_url(
+                        subreddit_name, page_number).encode() + rb'\g<2>',
+                    response.content,
+                ))
+            print(f'Recorded {path}')
+
+            if not url:
+                break
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record')
+    record_parser.add_argument('subreddits')
+    record_parser.add_argument('--depth', type=int,
+                               default=utils.DEFAULT_DEPTH)
+    arguments = parser.parse_args()
+
+    record(arguments.subreddits, arguments.depth)
@@ -0,0 +1,72 @@
+"""Compare the memory of Thread records against the previous dicts.
+
+Synthetic listing pages (benchmarks.replay.make_page) are parsed into
+utils.Thread and into the dicts previously built by _parse_reddit_items,
+measuring with tracemalloc the memory still allocated by each side.
+
+Usage: python -m benchmarks.threads [--pages 1000]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks import replay
+from reddit import utils
+
+SUBREDDITS = 20
+
+
+def thread_to_dict(thread):
+    """Build the dict _parse_reddit_items returned before Thread."""
+    return {
+        'title': thread.title,
+        'link': f'{utils.BASE_URL}{thread.url}'
+        if thread.url.startswith('/r/') else thread.url,
+        'upvotes': thread.upvotes,
+        'comments_link': f'{utils.BASE_URL}{thread.permalink}',
+        'subreddit_link': f'{utils.BASE_URL}/r/{thread.subreddit}',
+    }
+
+
+def _parse_pages(pages):
+    threads = []
+    for index in range(pages):
+        content = replay.make_page(f'sub{index % SUBREDDITS}', index)
+        response = utils.fetch.Response('', 200, {}, content)
+        threads.extend(utils._parse_response(response, 'lxml-strainer')[0])
+    return threads
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    # Parsed documents are reference cycles, freed only by the collector.
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main(pages):
+    # Warms the parser up, so its caches are not counted by either side.
+    _parse_pages(1)
+
+    dict_size, dicts = _measure(
+        lambda: [thread_to_dict(thread) for thread in _parse_pages(pages)])
+    thread_size, threads = _measure(lambda: _parse_pages(pages))
+
+    assert [thread.as_dict() for thread in threads] == dicts
+
+    print(f'{len(threads)} threads of {pages} pages')
+    print(f'{"dicts":>8}: {dict_size / 1024 / 1024:8.2f} MB '
+          f'({dict_size / len(threads):.0f} bytes per thread)')
+    print(f'{"Thread":>8}: {thread_size / 1024 / 1024:8.2f} MB '
+          f'({thread_size / len(threads):.0f} bytes per thread)')
+    print(f'{"saving":>8}: {1 - thread_size / dict_size:8.1%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=1000)
+    main(parser.parse_args().pages)
@@ -1,3 +1,20 @@
-from reddit.telegram import app
+__all__ = ['app', 'create_app']
 
-__all__ = ['app']
+
+def create_app():
+    """Create the web app of the Telegram bot.
+
+    The bot module, Flask and its settings are only loaded here, so
+    importing the crawler modules stays fast and free of side effects.
+
+    :rtype: flask.Flask
+    """
+    from reddit import telegram
+    return telegram.create_app()
+
+
+def __getattr__(name):
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -2,6 +2,8 @@ import json
 
 import click
 
+import cache
+import state
 import utils
 
 
@@ -19,11 +21,167 @@ import utils
     default=5000,
     help='Min up votes value.',
 )
+@click.option(
+    '--backend',
+    default=utils.DEFAULT_BACKEND,
+    type=click.Choice(sorted(utils.BACKENDS)),
+    help='Listing format, HTML pages or JSON.',
+)
+@click.option(
+    '--parser',
+    default=utils.DEFAULT_PARSER,
+    type=click.Choice(sorted(utils.PARSERS)),
+    help='HTML parser backend.',
+)
+@click.option(
+    '--depth',
+    default=utils.DEFAULT_DEPTH,
+    type=click.IntRange(min=1),
+    help='Max pages crawled per subreddit.',
+)
+@click.option(
+    '--top',
+    default=None,
+    type=click.Choice(utils.TOP_PERIODS),
+    help='Crawl the top listing of the period, stopping below min up votes.',
+)
+@click.option(
+    '--batch-size',
+    default=utils.DEFAULT_BATCH_SIZE,
+    type=click.IntRange(min=1),
+    help='Max subreddits requested together in a combined listing.',
+)
+@click.option(
+    '--concurrency',
+    default=utils.fetch.DEFAULT_CONCURRENCY,
+    type=click.IntRange(min=1),
+    help='Max in-flight requests.',
+)
+@click.option(
+    '--rate',
+    default=utils.fetch.limits.DEFAULT_RATE,
+    type=click.FloatRange(min=0),
+    help='Max requests per second to reddit, 0 for no limit.',
+)
+@click.option(
+    '--connect-timeout',
+    default=utils.fetch.DEFAULT_CONNECT_TIMEOUT,
+    type=click.FloatRange(min=0),
+    help='Seconds to wait for a connection.',
+)
+@click.option(
+    '--read-timeout',
+    default=utils.fetch.DEFAULT_READ_TIMEOUT,
+    type=click.FloatRange(min=0),
+    help='Seconds to wait for each read of a response.',
+)
+@click.option(
+    '--retries',
+    default=utils.fetch.DEFAULT_RETRIES,
+    type=click.IntRange(min=0),
+    help='Max retries of a failed request.',
+)
+@click.option(
+    '--hedge',
+    default=False,
+    is_flag=True,
+    help='Send a duplicate of slow requests, using the first reply.',
+)
+@click.option(
+    '--hedge-after',
+    default=None,
+    type=click.FloatRange(min=0),
+    help='Seconds before hedging, the observed p95 latency by default.',
+)
+@click.option(
+    '--parse-workers',
+    default=utils.DEFAULT_PARSE_WORKERS,
+    type=click.IntRange(min=1),
+    help='Processes parsing pages, used only on runs with many pages.',
+)
+@click.option(
+    '--stream',
+    default=False,
+    is_flag=True,
+    help='Print each thread as a JSON line as soon as it is found.',
+)
+@click.option(
+    '--cache-dir',
+    default=cache.DEFAULT_DIRECTORY,
+    help='Directory of the listing pages cache.',
+)
+@click.option(
+    '--cache-ttl',
+    default=cache.DEFAULT_TTL,
+    help='Seconds a cached page is used without revalidation.',
+)
+@click.option(
+    '--no-cache',
+    default=False,
+    is_flag=True,
+    help='Bypass the listing pages cache.',
+)
+@click.option(
+    '--refresh-cache',
+    default=False,
+    is_flag=True,
+    help='Download every page again, refreshing the cache.',
+)
+@click.option(
+    '--dedup-links',
+    default=False,
+    is_flag=True,
+    help='Report threads with the same link, like cross-posts, once.',
+)
+@click.option(
+    '--incremental',
+    default=False,
+    is_flag=True,
+    help='Print only threads new or changed since previous runs.',
+)
+@click.option(
+    '--state-file',
+    default=state.DEFAULT_PATH,
+    help='SQLite file of the incremental crawl state.',
+)
 @utils.command_surrounded_by_frame
 @utils.command_exception_handler
 @utils.command_logging
-def get_reddits(subreddits, log, min_upvotes):
-    print(json.dumps(utils.get_reddits(subreddits, min_upvotes), indent=2))
+def get_reddits(subreddits, log, min_upvotes, backend, parser, depth, top,
+                batch_size, concurrency, rate, connect_timeout, read_timeout,
+                retries, hedge, hedge_after, parse_workers, stream, cache_dir,
+                cache_ttl,
+                no_cache, refresh_cache, dedup_links, incremental,
+                state_file):
+    options = dict(
+        min_upvotes=min_upvotes,
+        backend=backend,
+        parser=parser,
+        depth=depth,
+        top=top,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        rate=rate,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries=retries,
+        hedge=hedge or hedge_after is not None,
+        hedge_after=hedge_after,
+        parse_workers=parse_workers,
+        cache=None if no_cache else cache.HTTPCache(
+            cache_dir, cache_ttl, refresh=refresh_cache
+        ),
+        crawl_state=state.CrawlState(state_file) if incremental else None,
+        dedup_links=dedup_links,
+    )
+
+    if stream:
+        for thread in utils.iter_reddits(subreddits, **options):
+            print(json.dumps(thread, default=utils.Thread.as_dict),
+                  flush=True)
+    else:
+        print(json.dumps(utils.get_reddits(subreddits, **options),
+                         indent=2, default=utils.Thread.as_dict))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,186 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'reddit')
+DEFAULT_TTL = 300
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+CacheEntry = collections.namedtuple(
+    'CacheEntry', ('stored_at', 'url', 'status', 'headers', 'content')
+)
+
+
+class HTTPCache:
+    """On disk cache of HTTP responses.
+
+    Entries younger than ttl are served without touching the network.
+    Older entries are revalidated with a conditional request using their
+    ETag / Last-Modified headers. The least recently used entries are
+    evicted when the cache gets bigger than max_size bytes. The cache size
+    is tracked as entries are stored, so the directory is only scanned on
+    the first store and when an eviction is needed. The directory is
+    created on the first stored entry.
+
+    :param directory: Directory where entries are stored.
+    :type directory: str
+    :param ttl: Seconds an entry is served without revalidation.
+    :type ttl: int
+    :param max_size: Max size of the cache in bytes.
+    :type max_size: int
+    :param refresh: If true entries are never served, only rewritten.
+    :type refresh: bool
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, ttl=DEFAULT_TTL,
+                 max_size=DEFAULT_MAX_SIZE, refresh=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh = refresh
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _get_path(self, url):
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.directory, f'{key}.cache')
+
+    def get(self, url):
+        """Return the cached entry of given url.
+
+        :param url: Requested url.
+        :type url: str
+        :return: Cached entry or None.
+        :rtype: CacheEntry
+        """
+        if self.refresh:
+            return None
+
+        path = self._get_path(url)
+        try:
+            with open(path, 'rb') as file:
+                metadata = json.loads(file.readline())
+                content = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            logging.error(f'Can not read cache entry of "{url}". {ex}')
+            return None
+
+        return CacheEntry(content=content, **metadata)
+
+    def is_fresh(self, entry):
+        """Check if given entry can be served without revalidation.
+
+        :param entry: Cached entry.
+        :type entry: CacheEntry
+        :rtype: bool
+        """
+        return time.time() - entry.stored_at < self.ttl
+
+    @staticmethod
+    def get_validators(entry):
+        """Return the conditional request headers of given entry.
+
+        :param entry: Cached entry.
+        :type entry: CacheEntry
+        :return: Request headers.
+        :rtype: dict
+        """
+        headers = {}
+        if 'etag' in entry.headers:
+            headers['If-None-Match'] = entry.headers['etag']
+        if 'last-modified' in entry.headers:
+            headers['If-Modified-Since'] = entry.headers['last-modified']
+        return headers
+
+    def revalidate(self, url, entry):
+        """Mark given entry as fresh after a "304 Not Modified" response.
+
+        :param url: Requested url.
+        :type url: str
+        :param entry: Cached entry.
+        :type entry: CacheEntry
+        """
+        self.store(url, entry)
+
+    def store(self, url, response):
+        """Store the response of given url.
+
+        :param url: Requested url.
+        :type url: str
+        :param response: Response with lower cased header names.
+        :type response: fetch.Response
+        """
+        metadata = {
+            'url': response.url,
+            'status': response.status,
+            'headers': response.headers,
+            'stored_at': time.time(),
+        }
+
+        path = self._get_path(url)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            file_descriptor, temp_path = \
+                tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(file_descriptor, 'wb') as file:
+                file.write(json.dumps(metadata).encode())
+                file.write(b'\n')
+                file.write(response.content)
+                stored_size = file.tell()
+            replaced_size = _get_size(path)
+            os.replace(temp_path, path)
+        except Exception as ex:
+            logging.error(f'Can not store cache entry of "{url}". {ex}')
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += stored_size - replaced_size
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another cache
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(entry_size for _, entry_size, _ in self._scan())
+
+    def _evict(self):
+        entries = self._scan()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+        self._size = size
+
+
+def _get_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
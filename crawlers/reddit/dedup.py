@@ -0,0 +1,82 @@
+import collections
+import urllib.parse
+
+DEFAULT_MAX_KEYS = 100000
+
+
+def get_canonical_link(link):
+    """Normalize a thread link so equal targets compare equal.
+
+    :param link: Thread link.
+    :type link: str
+    :rtype: str
+    """
+    parts = urllib.parse.urlsplit(link)
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    return urllib.parse.urlunsplit(
+        ('', host, parts.path.rstrip('/'), parts.query, '')
+    )
+
+
+class Deduplicator:
+    """Streaming de-duplication of threads.
+
+    Threads are identified by fullname and, optionally, by canonical link,
+    so cross-posts of the same link are reported once. The first copy is
+    reported as it was seen, and is never changed by later duplicates,
+    since it may already be printed or stored. Only the most recent
+    max_keys keys are remembered, bounding memory.
+
+    :param links: If true threads with the same link are duplicates.
+    :type links: bool
+    :param max_keys: Max number of remembered keys.
+    :type max_keys: int
+    """
+
+    def __init__(self, links=False, max_keys=DEFAULT_MAX_KEYS):
+        self.links = links
+        self.max_keys = max_keys
+        self.dropped = 0
+        self._keys = collections.OrderedDict()
+
+    def _get_keys(self, thread):
+        keys = [thread.thread_id]
+        if self.links:
+            keys.append(get_canonical_link(thread.link))
+        return keys
+
+    def _remember(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def filter(self, threads, min_upvotes=None):
+        """Return given threads not seen before.
+
+        Threads below min_upvotes are returned but not remembered, so they
+        do not hide a later copy with enough up votes.
+
+        :param threads: Threads.
+        :type threads: list
+        :param min_upvotes: Min up votes of the remembered threads.
+        :type min_upvotes: int
+        :return: New threads.
+        :rtype: list
+        """
+        unique = []
+        for thread in threads:
+            keys = self._get_keys(thread)
+            if any(key in self._keys for key in keys):
+                self.dropped += 1
+                continue
+
+            unique.append(thread)
+            if min_upvotes is None or thread.upvotes >= min_upvotes:
+                for key in keys:
+                    self._remember(key)
+
+        return unique
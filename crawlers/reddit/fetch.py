@@ -0,0 +1,432 @@
+import asyncio
+import collections
+import logging
+import random
+import time
+
+try:
+    from . import limits, metrics
+except ImportError:  # executed as "python reddit", without a parent package
+    import limits
+    import metrics
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 15.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 200
+
+CACHE_HITS = metrics.Counter(
+    'reddit_http_cache_hits_total',
+    'Listing pages served or revalidated by the HTTP cache.')
+
+Response = collections.namedtuple(
+    'Response', ('url', 'status', 'headers', 'content')
+)
+
+
+def _get_cached_response(entry):
+    return Response(entry.url, entry.status, entry.headers, entry.content)
+
+
+class FetchStats:
+    """Counters and latencies of the requests of a crawl run."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def get_percentile(self, percentile):
+        """Return a percentile of the recent latencies.
+
+        :param percentile: Percentile between 0 and 1.
+        :type percentile: float
+        :return: Latency in seconds, None without samples.
+        :rtype: float
+        """
+        if not self.latencies:
+            return None
+
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * percentile))
+        return latencies[index]
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'p95': self.get_percentile(0.95),
+        }
+
+    def __str__(self):
+        p95 = self.get_percentile(0.95)
+        return (
+            f'{self.requests} requests, {self.retries} retries, '
+            f'{self.hedges} hedges ({self.hedge_wins} won), '
+            f'{self.timeouts} timeouts, {self.errors} errors, '
+            f'p95 {p95 or 0:.3f}s'
+        )
+
+
+class _OpenResponse:
+    """Response whose content is not read yet, holding a host slot.
+
+    :param response: Response of the aiohttp session.
+    :type response: aiohttp.ClientResponse
+    :param host_limit: Limit of the host, released on close.
+    :type host_limit: limits.HostLimit
+    :param started_at: Monotonic time the request was sent.
+    :type started_at: float
+    """
+
+    def __init__(self, response, host_limit, started_at):
+        self.response = response
+        self.status = response.status
+        self.headers = {
+            name.lower(): value for name, value in response.headers.items()
+        }
+        self.host_limit = host_limit
+        self.started_at = started_at
+
+    async def close(self):
+        """Drop the content freeing the host slot."""
+        self.response.close()
+        await self.host_limit.release(self.status, self.headers)
+
+
+class Fetcher:
+    """Asynchronous HTTP client shared by every request of a crawl run.
+
+    A single keep-alive connection pool is opened on enter and closed on
+    exit, so TLS handshakes are paid once per connection instead of once
+    per page.
+
+    Requests have connect and read timeouts and are retried with jittered
+    exponential backoff on errors and 429 / 5xx responses. With hedging, a
+    duplicate request is sent when the first one is slower than
+    hedge_after seconds (or the observed p95 latency when it is None), and
+    the first reply wins.
+
+    :param concurrency: Max number of in-flight requests.
+    :type concurrency: int
+    :param headers: Headers sent with every request.
+    :type headers: dict
+    :param cache: Optional on disk cache of responses.
+    :type cache: cache.HTTPCache
+    :param rate: Requests per second of each host, 0 disables it.
+    :type rate: float
+    :param connect_timeout: Seconds to wait for a connection.
+    :type connect_timeout: float
+    :param read_timeout: Seconds to wait for each read of a response.
+    :type read_timeout: float
+    :param retries: Max number of retries of a request.
+    :type retries: int
+    :param hedge: If true slow requests are hedged.
+    :type hedge: bool
+    :param hedge_after: Seconds before hedging, None to use the p95.
+    :type hedge_after: float
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, headers=None,
+                 cache=None, rate=limits.DEFAULT_RATE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES,
+                 hedge=False, hedge_after=None):
+        self.concurrency = concurrency
+        self.headers = headers
+        self.cache = cache
+        self.limiter = limits.RateLimiter(rate, concurrency)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.stats = FetchStats()
+        self._session = None
+
+    async def __aenter__(self):
+        import aiohttp  # slow to import, only loaded by crawls
+
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout,
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+        logging.info(f'Fetch summary: {self.stats}.')
+
+    async def get(self, url):
+        """Request given url reading its whole content.
+
+        Fresh cached responses are returned without a request and stale
+        ones are revalidated with a conditional request. Requests wait
+        for the limits of the url host.
+
+        :param url: Url to be requested.
+        :type url: str
+        :return: Response with lower cased header names.
+        :rtype: Response
+        """
+        entry = self.cache.get(url) if self.cache else None
+
+        if entry:
+            if self.cache.is_fresh(entry):
+                logging.info(f'Cache hit "{url}".')
+                CACHE_HITS.inc()
+                return _get_cached_response(entry)
+            request_headers = self.cache.get_validators(entry)
+        else:
+            request_headers = None
+
+        response = await self._request_with_retries(url, request_headers)
+
+        if entry and response.status == 304:
+            logging.info(f'Cache revalidated "{url}".')
+            CACHE_HITS.inc()
+            self.cache.revalidate(url, entry)
+            return _get_cached_response(entry)
+
+        if self.cache and response.status == 200:
+            self.cache.store(url, response)
+
+        return response
+
+    async def stream(self, url, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Request given url yielding its content as it arrives.
+
+        Like get, fresh cached responses are yielded whole and stale ones
+        are revalidated. Until its headers arrive, the request is retried
+        and hedged like the ones of get, later errors are raised since
+        chunks were already yielded. With a cache, complete 200 responses
+        are stored. Error statuses raise aiohttp.ClientResponseError.
+
+        :param url: Url to be requested.
+        :type url: str
+        :param chunk_size: Max size of each chunk.
+        :type chunk_size: int
+        :return: Async generator of content chunks.
+        :rtype: collections.abc.AsyncIterator
+        """
+        entry = self.cache.get(url) if self.cache else None
+
+        if entry:
+            if self.cache.is_fresh(entry):
+                logging.info(f'Cache hit "{url}".')
+                CACHE_HITS.inc()
+                yield entry.content
+                return
+            request_headers = self.cache.get_validators(entry)
+        else:
+            request_headers = None
+
+        opened = await self._request_with_retries(
+            url, request_headers, self._open, _OpenResponse.close)
+
+        if entry and opened.status == 304:
+            await opened.close()
+            logging.info(f'Cache revalidated "{url}".')
+            CACHE_HITS.inc()
+            self.cache.revalidate(url, entry)
+            yield entry.content
+            return
+
+        response, host_limit = opened.response, opened.host_limit
+        status, headers = opened.status, opened.headers
+        chunks = [] if self.cache and status == 200 else None
+        try:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(chunk_size):
+                if chunks is not None:
+                    chunks.append(chunk)
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            response.close()
+            await host_limit.release(adapt=False)
+            raise
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            response.close()
+            await host_limit.release()
+            raise
+        except BaseException:
+            self.stats.errors += 1
+            response.close()
+            await host_limit.release(status, headers)
+            raise
+
+        response.release()
+        self.stats.latencies.append(time.monotonic() - opened.started_at)
+        await host_limit.release(status, headers)
+
+        if chunks is not None:
+            self.cache.store(url, Response(
+                url=str(response.url),
+                status=status,
+                headers=headers,
+                content=b''.join(chunks),
+            ))
+
+    async def _open(self, url, request_headers):
+        """Send a request returning as soon as its headers arrive."""
+        host_limit = self.limiter.get(url)
+        await host_limit.acquire()
+
+        self.stats.requests += 1
+        started_at = time.monotonic()
+        try:
+            response = await self._session.get(url, headers=request_headers)
+        except asyncio.CancelledError:
+            await host_limit.release(adapt=False)
+            raise
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            await host_limit.release()
+            raise
+        except BaseException:
+            self.stats.errors += 1
+            await host_limit.release()
+            raise
+
+        return _OpenResponse(response, host_limit, started_at)
+
+    def _get_backoff(self, attempt):
+        return random.uniform(0, DEFAULT_BACKOFF * 2 ** attempt)
+
+    async def _request_with_retries(self, url, request_headers,
+                                    request=None, discard=None):
+        """Send a request retrying errors and 429 / 5xx responses.
+
+        :param request: Coroutine function receiving the url and request
+            headers, _request by default.
+        :type request: callable
+        :param discard: Optional coroutine function freeing a response that
+            is not returned.
+        :type discard: callable
+        """
+        import aiohttp
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self._request_hedged(
+                    url, request_headers, request, discard)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                if last_attempt:
+                    raise
+                logging.info(f'Retrying "{url}" after error. {ex!r}')
+            else:
+                if last_attempt or response.status not in RETRY_STATUSES:
+                    return response
+                logging.info(
+                    f'Retrying "{url}" after status {response.status}.')
+                if discard is not None:
+                    await discard(response)
+
+            self.stats.retries += 1
+            await asyncio.sleep(self._get_backoff(attempt))
+
+    def _get_hedge_delay(self):
+        if self.hedge_after is not None:
+            return self.hedge_after
+
+        if len(self.stats.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+
+        return self.stats.get_percentile(HEDGE_PERCENTILE)
+
+    async def _request_hedged(self, url, request_headers, request=None,
+                              discard=None):
+        request = request or self._request
+        delay = self._get_hedge_delay() if self.hedge else None
+        if delay is None:
+            return await request(url, request_headers)
+
+        first = asyncio.ensure_future(request(url, request_headers))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        logging.info(f'Hedging "{url}" after {delay:.3f}s.')
+        self.stats.hedges += 1
+        hedged = asyncio.ensure_future(request(url, request_headers))
+
+        pending, winner = {first, hedged}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            self.stats.hedge_wins += 1
+                        winner = task
+                        return task.result()
+            return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if discard is not None:
+                for task in {first, hedged} - {winner}:
+                    if not task.cancelled() and task.exception() is None:
+                        await discard(task.result())
+
+    async def _request(self, url, request_headers):
+        host_limit = self.limiter.get(url)
+        await host_limit.acquire()
+
+        self.stats.requests += 1
+        started_at = time.monotonic()
+        status, headers = None, None
+        try:
+            async with self._session.get(url, headers=request_headers) \
+                    as response:
+                content = await response.read()
+                status, headers = response.status, {
+                    name.lower(): value
+                    for name, value in response.headers.items()
+                }
+        except asyncio.CancelledError:
+            await host_limit.release(adapt=False)
+            raise
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            await host_limit.release()
+            raise
+        except BaseException:
+            self.stats.errors += 1
+            await host_limit.release()
+            raise
+
+        self.stats.latencies.append(time.monotonic() - started_at)
+        await host_limit.release(status, headers)
+
+        return Response(
+            url=str(response.url),
+            status=status,
+            headers=headers,
+            content=content,
+        )
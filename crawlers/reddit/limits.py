@@ -0,0 +1,188 @@
+import asyncio
+import email.utils
+import logging
+import time
+import urllib.parse
+
+DEFAULT_RATE = 10.0
+DEFAULT_INITIAL_CONCURRENCY = 4
+
+THROTTLING_STATUSES = {429, 503}
+
+
+def _is_healthy(status):
+    return status is not None and status != 429 and status < 500
+
+
+def _parse_retry_after(value):
+    """Return the seconds to wait from a Retry-After header value.
+
+    :param value: Seconds or HTTP date.
+    :type value: str
+    :return: Seconds to wait, None if the value is invalid.
+    :rtype: float
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HostLimit:
+    """Token bucket and adaptive concurrency limit of a single host.
+
+    Concurrency follows AIMD: it grows by one request after a full window
+    of healthy responses and is halved on 429 / 5xx responses or errors.
+    Retry-After headers pause every request to the host.
+
+    :param host: Host name, used in logs.
+    :type host: str
+    :param rate: Requests per second, 0 disables the token bucket.
+    :type rate: float
+    :param max_concurrency: Max number of in-flight requests.
+    :type max_concurrency: int
+    :param concurrency: Initial number of in-flight requests.
+    :type concurrency: int
+    """
+
+    def __init__(self, host, rate=DEFAULT_RATE, max_concurrency=16,
+                 concurrency=DEFAULT_INITIAL_CONCURRENCY):
+        self.host = host
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.concurrency = min(concurrency, max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._tokens = max(rate, 1.0)
+        self._updated_at = time.monotonic()
+        self._successes = 0
+        self._condition = None
+
+    def _get_condition(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _take_token(self):
+        """Take a token returning the seconds to wait when there is none."""
+        now = time.monotonic()
+        if self.paused_until > now:
+            return self.paused_until - now
+
+        if not self.rate:
+            return 0.0
+
+        self._tokens = min(
+            max(self.rate, 1.0),
+            self._tokens + (now - self._updated_at) * self.rate,
+        )
+        self._updated_at = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        """Wait for a free request slot and a token."""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(
+                lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+
+        try:
+            delay = self._take_token()
+            while delay:
+                await asyncio.sleep(delay)
+                delay = self._take_token()
+        except BaseException:
+            await self.release(adapt=False)
+            raise
+
+    async def release(self, status=None, headers=None, adapt=True):
+        """Free the request slot adapting limits to the response.
+
+        :param status: Response status, None if the request failed.
+        :type status: int
+        :param headers: Response headers with lower cased names.
+        :type headers: dict
+        :param adapt: If false limits are kept, like for cancelled requests.
+        :type adapt: bool
+        """
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            if adapt:
+                self._adapt(status, headers or {})
+            condition.notify_all()
+
+    def _adapt(self, status, headers):
+        if status in THROTTLING_STATUSES:
+            retry_after = _parse_retry_after(headers.get('retry-after'))
+            if retry_after:
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + retry_after)
+                logging.info(
+                    f'Pausing "{self.host}" for {retry_after:.1f}s.')
+
+        if _is_healthy(status):
+            self._successes += 1
+            if self._successes >= self.concurrency and \
+                    self.concurrency < self.max_concurrency:
+                self._successes = 0
+                self.concurrency += 1
+                self._log_limits()
+            return
+
+        self._successes = 0
+        self.concurrency = max(1, self.concurrency // 2)
+        self._log_limits(status)
+
+    def _log_limits(self, status=None):
+        reason = f' after status {status}' if status else ''
+        rate = f'{self.rate:g}/s' if self.rate else 'unlimited'
+        logging.info(
+            f'Limits of "{self.host}"{reason}: '
+            f'{self.concurrency} concurrent requests, {rate}.'
+        )
+
+
+class RateLimiter:
+    """Per host limits of a crawl run.
+
+    :param rate: Requests per second of each host, 0 disables it.
+    :type rate: float
+    :param max_concurrency: Max number of in-flight requests per host.
+    :type max_concurrency: int
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, max_concurrency=16):
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self._hosts = {}
+
+    def get(self, url):
+        """Return the limit of given url host.
+
+        :param url: Requested url.
+        :type url: str
+        :rtype: HostLimit
+        """
+        host = urllib.parse.urlsplit(url).hostname
+        host_limit = self._hosts.get(host)
+        if host_limit is None:
+            host_limit = self._hosts[host] = HostLimit(
+                host, self.rate, self.max_concurrency)
+        return host_limit
@@ -0,0 +1,149 @@
+import bisect
+import contextlib
+import threading
+import time
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Collection of metrics rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the text exposition format.
+
+        :rtype: str
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.collect())
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    """Monotonically increasing value.
+
+    :param name: Metric name.
+    :type name: str
+    :param documentation: Metric help text.
+    :type documentation: str
+    :param registry: Registry rendering the metric.
+    :type registry: Registry
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def collect(self):
+        return [f'{self.name} {_format_value(self.value)}']
+
+
+class Gauge(Counter):
+    """Value that goes up and down."""
+
+    type = 'gauge'
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @contextlib.contextmanager
+    def track_in_progress(self):
+        """Increment the gauge while the block runs."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Histogram:
+    """Distribution of observed values into cumulative buckets.
+
+    :param name: Metric name.
+    :type name: str
+    :param documentation: Metric help text.
+    :type documentation: str
+    :param buckets: Sorted upper bounds of the buckets.
+    :type buckets: tuple
+    :param registry: Registry rendering the metric.
+    :type registry: Registry
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS,
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        """Observe the seconds the block takes to run."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at)
+
+    def collect(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{{le="{_format_value(bucket)}"}} '
+                f'{cumulative}'
+            )
+        lines.append(f'{self.name}_sum {_format_value(total)}')
+        lines.append(f'{self.name}_count {cumulative}')
+        return lines
@@ -0,0 +1,101 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 128
+
+
+class ResultCache:
+    """Thread safe in memory cache of crawl results.
+
+    Results expire after ttl seconds and the least recently used ones are
+    dropped when there are more than max_entries. Concurrent calls for the
+    same key share a single computation (single flight).
+
+    :param ttl: Seconds a result is kept.
+    :type ttl: int
+    :param max_entries: Max number of results kept.
+    :type max_entries: int
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached result of given key.
+
+        :param key: Hashable key.
+        :return: Cached result or None.
+        """
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """Cache the result of given key.
+
+        :param key: Hashable key.
+        :param value: Result.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result of given key computing it if missing.
+
+        If the same key is already being computed, waits for and returns
+        that computation result instead of starting another one.
+
+        :param key: Hashable key.
+        :param compute: Callable without arguments returning the result.
+        :type compute: callable
+        :return: Result.
+        """
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                return value
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as ex:
+            future.set_exception(ex)
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+        return value
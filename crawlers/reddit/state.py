@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'reddit', 'state.sqlite3'
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    subreddit TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+)
+'''
+
+
+class CrawlState:
+    """SQLite store of the threads reported by previous crawls.
+
+    Keeps the last score of each thread, so incremental crawls report only
+    new or changed threads and stop on pages they already know.
+
+    :param path: SQLite database file.
+    :type path: str
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(SCHEMA)
+
+    def get_scores(self, threads):
+        """Return the last known score of given threads.
+
+        :param threads: Threads.
+        :type threads: list
+        :return: Dict of thread id to score, only for known threads.
+        :rtype: dict
+        """
+        thread_ids = [thread.thread_id for thread in threads]
+        if not thread_ids:
+            return {}
+
+        placeholders = ','.join('?' * len(thread_ids))
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT thread_id, score FROM threads '
+                f'WHERE thread_id IN ({placeholders})',
+                thread_ids,
+            ).fetchall()
+
+        return dict(rows)
+
+    def update(self, threads):
+        """Remember given threads returning the new or changed ones.
+
+        :param threads: Threads.
+        :type threads: list
+        :return: Threads unknown or with another score before the update.
+        :rtype: list
+        """
+        scores = self.get_scores(threads)
+        changed = [
+            thread for thread in threads
+            if scores.get(thread.thread_id) != thread.upvotes
+        ]
+
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO threads '
+                '(thread_id, subreddit, score, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                [
+                    (thread.thread_id, thread.subreddit_name,
+                     thread.upvotes, now)
+                    for thread in changed
+                ],
+            )
+
+        return changed
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,53 +1,454 @@
-import json
+import concurrent.futures
+import functools
+import logging
 from pprint import pprint
 from decouple import config
 
+import click
 import requests
-from flask import Flask, request
+from flask import Flask, Response, jsonify, request
 
-from . import utils
+from . import cache, metrics, results, utils, warmer, workers
 
-app = Flask(__name__)
+MIN_UPVOTES = 5000
+TELEGRAM_TIMEOUT = (5, 15)
+MESSAGE_LIMIT = 4096
 
-BOT_TOKEN = config('BOT_TOKEN')
-SERVER_URL = f'{config("NGROK_URL")}/{BOT_TOKEN}'
+WEBHOOK_SECONDS = metrics.Histogram(
+    'bot_webhook_seconds', 'Seconds to handle a webhook request.')
+UPDATES = metrics.Counter(
+    'bot_updates_total', 'Telegram updates received by the webhook.')
+MESSAGE_ERRORS = metrics.Counter(
+    'bot_message_errors_total', 'Messages that failed to be processed.')
+CRAWL_SECONDS = metrics.Histogram(
+    'bot_crawl_seconds', 'Seconds to crawl the subreddits of a message.')
+CRAWLS_IN_FLIGHT = metrics.Gauge(
+    'bot_crawls_in_flight', 'Crawls currently running.')
+RESULT_CACHE_HITS = metrics.Counter(
+    'bot_result_cache_hits_total',
+    'Messages answered without starting a crawl.')
+SEND_MESSAGE_SECONDS = metrics.Histogram(
+    'bot_send_message_seconds', 'Seconds of Telegram sendMessage calls.')
+WARM_REFRESHES = metrics.Counter(
+    'bot_warm_refreshes_total',
+    'Background refreshes of popular subreddits.')
 
 
 def _get_url(method):
-    return 'https://api.telegram.org/bot{}/{}'.format(BOT_TOKEN, method)
+    return 'https://api.telegram.org/bot{}/{}'.format(
+        config('BOT_TOKEN'), method)
+
+
+class BotState:
+    """Settings and shared state of the bot, read from the environment.
+
+    Caches, queues and the Telegram session are built here instead of at
+    import time, and a single instance is built on first use by
+    _get_state.
+    """
+
+    def __init__(self):
+        self.http_cache = cache.HTTPCache(
+            config('HTTP_CACHE_DIR', default=cache.DEFAULT_DIRECTORY),
+            config('HTTP_CACHE_TTL', default=cache.DEFAULT_TTL, cast=int),
+        )
+        self.warm_http_cache = cache.HTTPCache(
+            self.http_cache.directory, self.http_cache.ttl, refresh=True)
+        self.results = results.ResultCache(
+            config('RESULT_CACHE_TTL', default=results.DEFAULT_TTL,
+                   cast=int),
+            config('RESULT_CACHE_SIZE', default=results.DEFAULT_MAX_ENTRIES,
+                   cast=int),
+        )
+        self.warmer = warmer.CacheWarmer(
+            _warm,
+            config('WARM_TOP', default=warmer.DEFAULT_TOP, cast=int),
+            config('WARM_INTERVAL', default=warmer.DEFAULT_INTERVAL,
+                   cast=float),
+            config('WARM_BUDGET', default=warmer.DEFAULT_BUDGET, cast=int),
+            utils.DEFAULT_DEPTH,
+        )
+        self.work_queue = workers.WorkQueue(
+            _process_message,
+            config('BOT_WORKERS', default=workers.DEFAULT_WORKERS, cast=int),
+            config('BOT_QUEUE_SIZE', default=workers.DEFAULT_MAX_SIZE,
+                   cast=int),
+        )
+        self.update_ids = workers.RecentKeys()
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(
+            pool_maxsize=self.work_queue.workers))
+        self.chat_limiter = workers.KeyRateLimiter(
+            config('TELEGRAM_CHAT_RATE', default=workers.DEFAULT_KEY_RATE,
+                   cast=float))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_state():
+    return BotState()
+
+
+def _get_subreddits(subreddit_names):
+    """Normalize subreddit names, so equivalent requests are equal.
+
+    :param subreddit_names: Name of subbreddits separated by ";".
+    :type subreddit_names: str
+    :return: Sorted tuple of lower case subreddit names.
+    :rtype: tuple
+    """
+    return tuple(sorted({
+        subreddit_name.lower()
+        for subreddit_name in utils._split_subreddit_names(subreddit_names)
+    }))
+
+
+def _warm(subreddit):
+    """Crawl a popular subreddit again caching its fresh threads.
+
+    A failed crawl raises, keeping the previous result of the subreddit.
+
+    :param subreddit: Normalized subreddit name.
+    :type subreddit: str
+    :return: List of threads.
+    :rtype: list
+    """
+    bot = _get_state()
+    failed = set()
+    WARM_REFRESHES.inc()
+    with CRAWL_SECONDS.time(), CRAWLS_IN_FLIGHT.track_in_progress():
+        threads = utils.get_reddits(
+            subreddit, MIN_UPVOTES, cache=bot.warm_http_cache,
+            on_done=lambda subreddits, failed_subreddits:
+            failed.update(failed_subreddits))
+
+    if failed:
+        raise Exception(f'Can not crawl "{subreddit}".')
+    bot.results.set(((subreddit,), MIN_UPVOTES), {subreddit: threads})
+    return threads
+
+
+def _crawl(subreddits, min_upvotes, send):
+    """Crawl subreddits in a single run handing each one to send when done.
+
+    The threads of each subreddit are cached as soon as it is done. Failed
+    subreddits are neither cached nor handed to send, and make the crawl
+    raise once the other ones are done.
+
+    :param subreddits: Normalized subreddit names.
+    :type subreddits: tuple
+    :param min_upvotes: Min up votes value.
+    :type min_upvotes: int
+    :param send: Callable receiving a subreddit and its threads.
+    :type send: callable
+    :return: Dict of subreddit to threads.
+    :rtype: dict
+    """
+    bot = _get_state()
+    threads = {subreddit: [] for subreddit in subreddits}
+    failed = set()
+
+    def on_done(subreddit_names, failed_names):
+        for subreddit_name in subreddit_names:
+            subreddit = subreddit_name.lower()
+            if subreddit_name in failed_names:
+                failed.add(subreddit)
+                continue
+
+            bot.results.set(((subreddit,), min_upvotes),
+                            {subreddit: threads[subreddit]})
+            send(subreddit, threads[subreddit])
+
+    with CRAWL_SECONDS.time(), CRAWLS_IN_FLIGHT.track_in_progress():
+        for thread in utils.iter_reddits(
+                ';'.join(subreddits), min_upvotes, cache=bot.http_cache,
+                on_done=on_done):
+            threads.setdefault(thread.subreddit_name, []).append(thread)
+
+    if failed:
+        raise Exception(f'Can not crawl {", ".join(sorted(failed))}.')
+    return threads
+
+
+def _get_reddits(subreddit_names, min_upvotes=MIN_UPVOTES, send=None):
+    """Return the threads of each subreddit sharing equivalent requests.
+
+    Subreddit names are normalized, so "Cats;dogs" and "dogs;cats" share
+    the same in-flight crawl. Requests are recorded by the cache warmer.
+    Subreddits with cached results, like the warm ones, are handed to send
+    at once and the other ones are crawled together, each one handed to
+    send as soon as it is done.
+
+    :param subreddit_names: Name of subbreddits separated by ";".
+    :type subreddit_names: str
+    :param min_upvotes: Min up votes value.
+    :type min_upvotes: int
+    :param send: Optional callable receiving a subreddit and its threads.
+    :type send: callable
+    :return: Dict of subreddit to threads.
+    :rtype: dict
+    """
+    bot = _get_state()
+    subreddits = _get_subreddits(subreddit_names)
+    bot.warmer.record(subreddits)
+    if send is None:
+        def send(subreddit, threads):
+            pass
+
+    threads = {}
+    for subreddit in subreddits:
+        cached = bot.results.get(((subreddit,), min_upvotes))
+        if cached is not None:
+            threads.update(cached)
+            send(subreddit, cached[subreddit])
+
+    missing = tuple(
+        subreddit for subreddit in subreddits if subreddit not in threads)
+    crawled = []
+
+    def crawl():
+        crawled.append(True)
+        return _crawl(missing, min_upvotes, send)
+
+    if missing:
+        crawled_threads = bot.results.get_or_compute(
+            (missing, min_upvotes), crawl)
+        if not crawled:
+            for subreddit in missing:
+                send(subreddit, crawled_threads[subreddit])
+        threads.update(crawled_threads)
+
+    if not crawled:
+        RESULT_CACHE_HITS.inc()
+    return threads
 
 
 def _process_message(update):
-    data = {}
-    data['chat_id'] = update['message']['from']['id']
+    try:
+        _send_answer(update)
+    except Exception:
+        MESSAGE_ERRORS.inc()
+        raise
+
+
+def _render_threads(subreddit, threads):
+    """Render the threads of a subreddit as compact text.
+
+    :param subreddit: Subreddit name.
+    :type subreddit: str
+    :param threads: Threads of the subreddit.
+    :type threads: list
+    :rtype: str
+    """
+    if not threads:
+        return f'r/{subreddit}: nenhum thread com mais de {MIN_UPVOTES} ' \
+               f'upvotes.'
+
+    blocks = [f'r/{subreddit}: {len(threads)} threads']
+    for thread in sorted(threads, key=lambda thread: -thread.upvotes):
+        blocks.append(
+            f'{thread.upvotes} | {thread.title}\n'
+            f'{thread.link}\n'
+            f'Comentários: {thread.comments_link}'
+        )
+    return '\n\n'.join(blocks)
+
+
+def _split_message(text, limit=MESSAGE_LIMIT):
+    """Split text into messages of at most limit characters.
+
+    Text is split between blocks separated by blank lines, and blocks
+    longer than limit are cut.
+
+    :param text: Message text.
+    :type text: str
+    :param limit: Max number of characters of each message.
+    :type limit: int
+    :return: Messages.
+    :rtype: list
+    """
+    messages, message = [], ''
+    for block in text.split('\n\n'):
+        if message and len(message) + 2 + len(block) <= limit:
+            message = f'{message}\n\n{block}'
+            continue
+
+        if message:
+            messages.append(message)
+        while len(block) > limit:
+            messages.append(block[:limit])
+            block = block[limit:]
+        message = block
+
+    if message:
+        messages.append(message)
+    return messages
+
+
+def _send_message(chat_id, text):
+    """Send a message through the pooled session respecting chat limits.
+
+    A throttled message is sent again once, after the delay asked by
+    Telegram.
+
+    :param chat_id: Telegram chat id.
+    :type chat_id: int
+    :param text: Message text, at most MESSAGE_LIMIT characters.
+    :type text: str
+    """
+    bot = _get_state()
+    data = {'chat_id': chat_id, 'text': text}
+    for attempt in range(2):
+        bot.chat_limiter.wait(chat_id)
+        with SEND_MESSAGE_SECONDS.time():
+            response = bot.session.post(
+                _get_url('sendMessage'), data=data, timeout=TELEGRAM_TIMEOUT)
+
+        if response.status_code != 429 or attempt:
+            return
+
+        retry_after = response.json().get('parameters', {}) \
+            .get('retry_after', 1)
+        logging.info(f'Telegram throttled chat {chat_id}, waiting '
+                     f'{retry_after}s.')
+        bot.chat_limiter.delay(chat_id, retry_after)
+
+
+def _send_text(chat_id, text):
+    for message in _split_message(text):
+        _send_message(chat_id, message)
+
+
+def _send_reddits(chat_id, subreddit_names):
+    """Crawl the subreddits sending each one as soon as it is done.
+
+    Messages are sent by a thread of the message, so the crawl goes on
+    while they wait for the chat limits.
+
+    :param chat_id: Telegram chat id.
+    :type chat_id: int
+    :param subreddit_names: Name of subbreddits separated by ";".
+    :type subreddit_names: str
+    :return: False if there is no subreddit.
+    :rtype: bool
+    """
+    subreddits = _get_subreddits(subreddit_names)
+    if not subreddits:
+        return False
+
+    sent, futures = set(), []
+    with concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix='send') as sender:
+        def send(subreddit, threads):
+            sent.add(subreddit)
+            futures.append(sender.submit(
+                _send_text, chat_id, _render_threads(subreddit, threads)))
+
+        try:
+            _get_reddits(subreddit_names, send=send)
+        except Exception as ex:
+            logging.error(f'Can not get "{subreddit_names}". {ex}')
+            for subreddit in subreddits:
+                if subreddit not in sent:
+                    futures.append(sender.submit(
+                        _send_text, chat_id,
+                        f'r/{subreddit}: não foi possível buscar os '
+                        f'threads.'))
+
+    for future in futures:
+        future.result()
+    return True
+
+
+def _send_answer(update):
+    chat_id = update['message']['from']['id']
 
     if update['message']['text'].lower().find('nadaprafazer') == 1:
         command = update['message']['text'].split()
-        if len(command) >= 2:
-            threads = json.dumps(utils.get_reddits(command[1], 5000), indent=2)
-            data['text'] = threads
-        else:
-            data['text'] = 'Exemplo: /NadaPraFazer cats;dogs'
+        if len(command) >= 2 and _send_reddits(chat_id, command[1]):
+            return
+        text = 'Exemplo: /NadaPraFazer cats;dogs'
     else:
-        data['text'] = 'Help: /NadaPraFazer [+ Lista de subrredits]'
+        text = 'Help: /NadaPraFazer [+ Lista de subrredits]'
 
-    requests.post(_get_url('sendMessage'), data=data)
+    _send_message(chat_id, text)
 
 
-@app.route('/{}'.format(BOT_TOKEN), methods=['POST'])
 def _process_update():
-    if request.method == 'POST':
-        update = request.get_json()
-        if 'message' in update:
-            _process_message(update)
-        return 'ok!', 200
+    """Acknowledge the update handing its message to the work queue.
+
+    Updates retried by Telegram are ignored. When the queue is full the
+    update is refused, so Telegram delivers it again later.
+    """
+    bot = _get_state()
+    UPDATES.inc()
+    with WEBHOOK_SECONDS.time():
+        if request.method == 'POST':
+            update = request.get_json()
+            if 'message' in update:
+                update_id = update.get('update_id')
+                if not bot.update_ids.add(update_id):
+                    return 'ok!', 200
+
+                if not bot.work_queue.submit(update):
+                    bot.update_ids.discard(update_id)
+                    return 'busy', 503
+            return 'ok!', 200
+
+
+def _metrics():
+    """Expose bot and crawler metrics in Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+def _warm_status():
+    """List the subreddits kept warm by the cache warmer."""
+    return jsonify(_get_state().warmer.get_status())
+
 
+def create_app():
+    """Create the web app of the bot.
 
-def _configure():
-    requests.get(_get_url('setWebhook'), data={'url': SERVER_URL})
-    response = requests.get(_get_url('getWebhookInfo'))
+    Reads BOT_TOKEN, the path of the webhook route, and the settings of
+    the bot state. Nothing is requested to Telegram, the webhook is
+    registered once with the register command.
+
+    :rtype: flask.Flask
+    """
+    _get_state()
+
+    app = Flask(__name__)
+    app.add_url_rule(f'/{config("BOT_TOKEN")}', '_process_update',
+                     _process_update, methods=['POST'])
+    app.add_url_rule('/metrics', '_metrics', _metrics)
+    app.add_url_rule('/warm', '_warm_status', _warm_status)
+    return app
+
+
+def register_webhook():
+    """Point the bot webhook to the NGROK_URL of the web app.
+
+    :return: Webhook info returned by Telegram.
+    :rtype: dict
+    """
+    server_url = f'{config("NGROK_URL")}/{config("BOT_TOKEN")}'
+    requests.get(_get_url('setWebhook'), data={'url': server_url},
+                 timeout=TELEGRAM_TIMEOUT)
+    response = requests.get(
+        _get_url('getWebhookInfo'), timeout=TELEGRAM_TIMEOUT)
     pprint(response.status_code)
-    pprint(response.json())
+    return response.json()
+
+
+@click.group()
+def cli():
+    """Manage the Telegram bot."""
+
+
+@cli.command()
+def register():
+    """Register the webhook of the bot on Telegram."""
+    pprint(register_webhook())
 
 
-_configure()
+if __name__ == '__main__':
+    cli()
@@ -1,13 +1,60 @@
 import asyncio
-import concurrent
+import codecs
+import concurrent.futures
+import contextlib
+import functools
+import html.parser
+import json
 import logging
 import sys
+import time
+import urllib.parse
 
-from bs4 import BeautifulSoup
+try:
+    from . import dedup, fetch, metrics
+except ImportError:  # executed as "python reddit", without a parent package
+    import dedup
+    import fetch
+    import metrics
 
 BASE_URL = 'https://old.reddit.com'
 BASE_URL_SUBREDDIT = '/r/{subreddit}/'
-MAX_PAGES = 5
+BASE_URL_SUBREDDIT_TOP = '/r/{subreddit}/top/?t={period}'
+TOP_PERIODS = ('hour', 'day', 'week', 'month', 'year', 'all')
+
+DEFAULT_BACKEND = 'html'
+BACKENDS = {
+    # name: (listing path suffix, extra query)
+    'html': ('', {}),
+    'json': ('.json', {'raw_json': '1'}),
+}
+DEFAULT_DEPTH = 6
+DEFAULT_BATCH_SIZE = 1
+DEFAULT_PARSE_WORKERS = 1
+PARSE_POOL_MIN_PAGES = 16
+
+LISTING_CLASSES = {'thing', 'next-button'}
+DEFAULT_PARSER = 'html.parser'
+STREAM_PARSER = 'stream'
+PARSERS = {
+    # name: (BeautifulSoup features, parse only listing tags)
+    'html.parser': ('html.parser', False),
+    'lxml': ('lxml', False),
+    'strainer': ('html.parser', True),
+    'lxml-strainer': ('lxml', True),
+    # Incremental ListingExtractor, pages are parsed while they download
+    STREAM_PARSER: (None, False),
+}
+STREAM_BUFFER_CHUNKS = 64
+
+PAGE_FETCH_SECONDS = metrics.Histogram(
+    'reddit_page_fetch_seconds', 'Seconds to request a listing page.')
+PAGE_FETCH_ERRORS = metrics.Counter(
+    'reddit_page_fetch_errors_total', 'Listing pages that failed to load.')
+PAGE_PARSE_SECONDS = metrics.Histogram(
+    'reddit_page_parse_seconds', 'Seconds to parse a listing page.')
+PAGE_PARSE_ERRORS = metrics.Counter(
+    'reddit_page_parse_errors_total', 'Listing pages that failed to parse.')
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) '
@@ -24,6 +71,9 @@ def command_surrounded_by_frame(func):
     :rtype: callable
     """
     def inner(*args, **kwargs):
+        if kwargs.get('stream'):
+            return func(*args, **kwargs)
+
         max_length = 80
         print('=' * max_length)
         func(*args, **kwargs)
@@ -85,22 +135,158 @@ def _split_subreddit_names(subreddit_names):
     return tuple(name for name in subreddit_names.split(';') if name)
 
 
-def _request_url(url):
-    import requests
+def _plan_batches(subreddits, batch_size=DEFAULT_BATCH_SIZE):
+    """Group subreddits into combined listings.
+
+    :param subreddits: Tuple of subreddits.
+    :type subreddits: tuple
+    :param batch_size: Max number of subreddits of each listing.
+    :type batch_size: int
+    :return: List of subreddit tuples, one per combined listing.
+    :rtype: list
+    """
+    return [
+        subreddits[index:index + batch_size]
+        for index in range(0, len(subreddits), batch_size)
+    ]
+
+
+async def _request_url(fetcher, url):
     try:
-        return requests.get(
-            url,
-            headers=HEADERS,
-        )
+        with PAGE_FETCH_SECONDS.time():
+            response = await fetcher.get(url)
+        if response.status >= 400:
+            raise Exception(f'Status {response.status}.')
+        return response
     except Exception as ex:
+        PAGE_FETCH_ERRORS.inc()
         logging.error(f'Can not request. {ex}')
         raise Exception(f'Can not request "{url}".') from None
 
 
-def _request_subreddit(subreddit_name):
-    url = f'{BASE_URL}{BASE_URL_SUBREDDIT}' \
-          .format(subreddit=subreddit_name)
-    return _request_url(url)
+def _get_subreddit_url(subreddit_name, top=None, backend=DEFAULT_BACKEND):
+    """Return the first listing page url of a subreddit.
+
+    :param subreddit_name: Subreddit name.
+    :type subreddit_name: str
+    :param top: Period of the top listing, one of TOP_PERIODS.
+    :type top: str
+    :param backend: One of BACKENDS keys.
+    :type backend: str
+    :return: Listing url.
+    :rtype: str
+    """
+    if top:
+        url = f'{BASE_URL}{BASE_URL_SUBREDDIT_TOP}' \
+              .format(subreddit=subreddit_name, period=top)
+    else:
+        url = f'{BASE_URL}{BASE_URL_SUBREDDIT}' \
+              .format(subreddit=subreddit_name)
+
+    suffix, query = BACKENDS[backend]
+    if not suffix:
+        return url
+
+    path, _, url_query = url.partition('?')
+    query = dict(urllib.parse.parse_qsl(url_query), **query)
+    return f'{path}{suffix}?{urllib.parse.urlencode(query)}'
+
+
+async def _request_subreddit(fetcher, subreddit_name, top=None,
+                             backend=DEFAULT_BACKEND):
+    url = _get_subreddit_url(subreddit_name, top, backend)
+    return await _request_url(fetcher, url)
+
+
+def _get_absolute_url(url):
+    return f'{BASE_URL}{url}' if url.startswith('/r/') else url
+
+
+class Thread:
+    """Compact listing thread, serialized to a dict only on output.
+
+    Urls are kept as found in the listing and made absolute when read,
+    and subreddit names are interned, so threads of a subreddit share a
+    single string. Reads like thread['upvotes'] are supported for the keys
+    of as_dict, while the crawl uses the attributes.
+
+    :param title: Thread title.
+    :type title: str
+    :param url: Thread link, relative for self posts.
+    :type url: str
+    :param upvotes: Thread score.
+    :type upvotes: int
+    :param permalink: Comments page path.
+    :type permalink: str
+    :param subreddit: Subreddit name.
+    :type subreddit: str
+    """
+
+    __slots__ = ('title', 'url', 'upvotes', 'permalink', 'subreddit')
+
+    FIELDS = ('title', 'link', 'upvotes', 'comments_link', 'subreddit_link')
+
+    def __init__(self, title, url, upvotes, permalink, subreddit):
+        self.title = title
+        self.url = url
+        self.upvotes = upvotes
+        self.permalink = permalink
+        self.subreddit = sys.intern(subreddit)
+
+    @property
+    def link(self):
+        return _get_absolute_url(self.url)
+
+    @property
+    def comments_link(self):
+        return f'{BASE_URL}{self.permalink}'
+
+    @property
+    def subreddit_link(self):
+        return f'{BASE_URL}/r/{self.subreddit}'
+
+    @property
+    def thread_id(self):
+        """Thread fullname (t3_<id>), from the comments page path."""
+        return 't3_' + self.permalink.split('/comments/', 1)[1] \
+            .split('/', 1)[0]
+
+    @property
+    def subreddit_name(self):
+        """Subreddit name in lower case, as requested by the crawls."""
+        return self.subreddit.lower()
+
+    def as_dict(self):
+        """Return the thread in the output format.
+
+        :rtype: dict
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        return self[key] if key in self.FIELDS else default
+
+    def __eq__(self, other):
+        if not isinstance(other, Thread):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__
+        )
+
+    def __reduce__(self):
+        return Thread, tuple(getattr(self, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f'Thread({self.as_dict()!r})'
 
 
 def _parse_reddit_items(soup):
@@ -108,121 +294,847 @@ def _parse_reddit_items(soup):
 
     items = []
     for thread in threads:
-        link = f'{BASE_URL}{thread.get("data-url")}' \
-            if thread.get("data-url").startswith('/r/') \
-            else thread.get("data-url")
-
         tittle = thread.find('a', {'class': 'title'}).text
 
         logging.info(f'Found thread "{tittle}"')
 
-        items.append({
-            'title': tittle,
-            'link': link,
-            'upvotes': int(thread.get('data-score')),
-            'comments_link': f'{BASE_URL}{thread.get("data-permalink")}',
-            'subreddit_link': f'{BASE_URL}/r/{thread.get("data-subreddit")}',
-        })
+        items.append(Thread(
+            tittle,
+            thread.get('data-url'),
+            int(thread.get('data-score')),
+            thread.get('data-permalink'),
+            thread.get('data-subreddit'),
+        ))
 
     return items
 
 
-def _parse_response(response):
+def _is_listing_class(value):
+    """Check if a class attribute belongs to a listing tag.
+
+    :param value: Raw class attribute value.
+    :type value: str
+    :return: True if it is a thread or a next button.
+    :rtype: bool
+    """
+    return bool(value) and not LISTING_CLASSES.isdisjoint(value.split())
+
+
+@functools.lru_cache(maxsize=None)
+def _get_listing_strainer():
+    from bs4 import SoupStrainer
+
+    return SoupStrainer(['div', 'span'], attrs={'class': _is_listing_class})
+
+
+def _make_soup(content, parser=DEFAULT_PARSER):
+    """Build a single parsed document for a listing page.
+
+    :param content: Page content.
+    :type content: bytes
+    :param parser: One of PARSERS keys.
+    :type parser: str
+    :return: Parsed document.
+    :rtype: BeautifulSoup
+    """
+    from bs4 import BeautifulSoup  # slow to import, only loaded to parse
+
+    features, strained = PARSERS[parser]
+    if strained:
+        return BeautifulSoup(content, features,
+                             parse_only=_get_listing_strainer())
+    return BeautifulSoup(content, features)
+
+
+def _parse_next_page_url(soup, url=None):
     try:
-        return _parse_reddit_items(
-            BeautifulSoup(response.content, 'html.parser')
-        )
+        next_button = soup.find('span', {'class': 'next-button'})
+        return next_button.find('a').get('href')
+    except Exception:
+        logging.error(f'There is not next button on "{url}".')
+        return None
+
+
+def _has_class(attrs, name):
+    return name in (dict(attrs).get('class') or '').split()
+
+
+class ListingExtractor(html.parser.HTMLParser):
+    """Incremental extractor of the threads of a listing page.
+
+    Bytes are fed as they arrive and each div.thing is returned as soon as
+    its closing tag is read, while next_page_url is set as soon as the
+    next button link is read. No tree is built, so memory does not grow
+    with the page size.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.next_page_url = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._threads = []
+        self._thread = None
+        self._depth = 0
+        self._title = None
+        self._in_title = False
+        self._in_next_button = False
+
+    def feed_bytes(self, chunk):
+        """Parse a chunk of the page.
+
+        :param chunk: Page bytes following the previous chunk.
+        :type chunk: bytes
+        :return: Threads completed by the chunk.
+        :rtype: list
+        """
+        self.feed(self._decoder.decode(chunk))
+        return self._pop_threads()
+
+    def close(self):
+        """Parse what is left of the page.
+
+        :return: Threads completed by the end of the page.
+        :rtype: list
+        """
+        self.feed(self._decoder.decode(b'', final=True))
+        super().close()
+        return self._pop_threads()
+
+    def _pop_threads(self):
+        threads, self._threads = self._threads, []
+        return threads
+
+    def handle_starttag(self, tag, attrs):
+        if self._thread is not None:
+            if tag == 'div':
+                self._depth += 1
+            elif tag == 'a' and self._title is None and \
+                    _has_class(attrs, 'title'):
+                self._title = []
+                self._in_title = True
+        elif tag == 'div' and _has_class(attrs, 'thing'):
+            self._thread = dict(attrs)
+            self._depth = 1
+        elif tag == 'span' and _has_class(attrs, 'next-button'):
+            self._in_next_button = True
+        elif tag == 'a' and self._in_next_button and \
+                self.next_page_url is None:
+            self.next_page_url = dict(attrs).get('href')
+
+    def handle_endtag(self, tag):
+        if self._in_title and tag == 'a':
+            self._in_title = False
+        elif self._thread is not None and tag == 'div':
+            self._depth -= 1
+            if not self._depth:
+                self._end_thread()
+        elif tag == 'span':
+            self._in_next_button = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title.append(data)
+
+    def _end_thread(self):
+        attrs, title = self._thread, self._title
+        self._thread, self._title = None, None
+        if title is None:
+            raise ValueError('Thread without title.')
+
+        tittle = ''.join(title)
+        logging.info(f'Found thread "{tittle}"')
+
+        self._threads.append(Thread(
+            tittle,
+            attrs.get('data-url'),
+            int(attrs.get('data-score')),
+            attrs.get('data-permalink'),
+            attrs.get('data-subreddit'),
+        ))
+
+
+def _extract_listing(content, url=None):
+    extractor = ListingExtractor()
+    items = extractor.feed_bytes(content) + extractor.close()
+    if extractor.next_page_url is None:
+        logging.error(f'There is not next button on "{url}".')
+    return items, extractor.next_page_url
+
+
+def _parse_json_items(listing):
+    items = []
+    for child in listing['data']['children']:
+        thread = child['data']
+
+        logging.info(f'Found thread "{thread["title"]}"')
+
+        # Self posts link to themselves with an absolute url, while the
+        # HTML listing keeps the permalink.
+        url = thread['permalink'] if thread.get('is_self') else thread['url']
+        items.append(Thread(
+            thread['title'],
+            url,
+            int(thread['score']),
+            thread['permalink'],
+            thread['subreddit'],
+        ))
+
+    return items
+
+
+def _parse_json_next_page_url(listing, url):
+    after = listing['data'].get('after')
+    if not after:
+        return None
+
+    parts = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parts.query), after=after)
+    return urllib.parse.urlunsplit(
+        parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def _parse_json_response(response):
+    """Decode a JSON listing page into the same threads of HTML pages.
+
+    :param response: Listing page response.
+    :type response: fetch.Response
+    :return: Tuple with the page threads and the next page url.
+    :rtype: tuple
+    """
+    listing = json.loads(response.content)
+    return (
+        _parse_json_items(listing),
+        _parse_json_next_page_url(listing, response.url),
+    )
+
+
+def _parse_response(response, parser=DEFAULT_PARSER,
+                    backend=DEFAULT_BACKEND):
+    """Parse a listing page only once.
+
+    :param response: Listing page response.
+    :type response: requests.Response
+    :param parser: One of PARSERS keys.
+    :type parser: str
+    :param backend: One of BACKENDS keys.
+    :type backend: str
+    :return: Tuple with the page threads and the next page url.
+    :rtype: tuple
+    """
+    try:
+        with PAGE_PARSE_SECONDS.time():
+            if backend == 'json':
+                return _parse_json_response(response)
+
+            if parser == STREAM_PARSER:
+                return _extract_listing(response.content, response.url)
+
+            soup = _make_soup(response.content, parser)
+            return (
+                _parse_reddit_items(soup),
+                _parse_next_page_url(soup, response.url),
+            )
 
     except Exception as ex:
+        PAGE_PARSE_ERRORS.inc()
         logging.error(f'Can not parse response. {ex}')
-        raise Exception(f'Can not parse response.') from None
+        raise Exception('Can not parse response.') from None
 
 
-def _execute_func_concurrent(request_function, params):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+def _parse_content(content, url, parser=DEFAULT_PARSER,
+                   backend=DEFAULT_BACKEND):
+    """Parse raw page content, the unit of work sent to parse processes.
+
+    :param content: Page content.
+    :type content: bytes
+    :param url: Page url.
+    :type url: str
+    :return: Tuple with the page threads and the next page url.
+    :rtype: tuple
+    """
+    return _parse_response(fetch.Response(url, 200, {}, content), parser,
+                           backend)
+
+
+async def _parse_page(response, parser=DEFAULT_PARSER,
+                      backend=DEFAULT_BACKEND, executor=None):
+    """Parse a listing page in the executor processes, if any.
+
+    :param response: Listing page response.
+    :type response: fetch.Response
+    :param parser: One of PARSERS keys.
+    :type parser: str
+    :param backend: One of BACKENDS keys.
+    :type backend: str
+    :param executor: Optional process pool.
+    :type executor: concurrent.futures.ProcessPoolExecutor
+    :return: Tuple with the page threads and the next page url.
+    :rtype: tuple
+    """
+    if executor is None:
+        return _parse_response(response, parser, backend)
+
+    loop = asyncio.get_running_loop()
+    with PAGE_PARSE_SECONDS.time():
+        return await loop.run_in_executor(
+            executor, _parse_content, response.content, response.url,
+            parser, backend)
+
+
+@contextlib.contextmanager
+def _parse_executor(workers, pages):
+    """Open a process pool to parse pages, unless the run is small.
+
+    :param workers: Number of processes.
+    :type workers: int
+    :param pages: Max number of pages of the run.
+    :type pages: int
+    :return: Context manager of the pool, or None for in process parsing.
+    """
+    if workers <= 1 or pages < PARSE_POOL_MIN_PAGES:
+        yield None
+        return
 
+    executor = concurrent.futures.ProcessPoolExecutor(workers)
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=6) as pool:
-            futures = [
-                loop.run_in_executor(pool, request_function, param)
-                for param in params
-            ]
+        yield executor
+    finally:
+        executor.shutdown(cancel_futures=True)
 
-        loop.run_until_complete(asyncio.wait(futures))
-        loop.close()
 
-        return [future.result() for future in futures]
-    except Exception as ex:
-        logging.error(f'Can not execute requests as futures. {ex}')
-        return []
+def _is_below(items, min_upvotes):
+    """Check if a score ordered page reached threads below min_upvotes.
 
+    :param items: Page threads.
+    :type items: list
+    :param min_upvotes: Min up votes value.
+    :type min_upvotes: int
+    :return: True if no thread of the next pages can have enough votes.
+    :rtype: bool
+    """
+    return not items or \
+        min(item.upvotes for item in items) < min_upvotes
 
-def _request_concurrent(subreddits):
-    """Request each subreddit concurrently.
 
-    :param subreddits: Tuple of subreddits.
-    :type subreddits: tuple
-    :return: List of request.Response.
+def _is_known(items, scores, min_upvotes):
+    """Check if a page has no thread to report since the previous crawls.
+
+    Every thread must be known, with the same score or with less than
+    min_upvotes, the ones that are never reported.
+
+    :param items: Page threads.
+    :type items: list
+    :param scores: Last known scores by thread id.
+    :type scores: dict
+    :param min_upvotes: Min up votes value.
+    :type min_upvotes: int
+    :return: True if the next pages are not worth crawling again.
+    :rtype: bool
+    """
+    return bool(items) and all(
+        item.thread_id in scores and (
+            scores[item.thread_id] == item.upvotes or
+            item.upvotes < (min_upvotes or 0)
+        )
+        for item in items
+    )
+
+
+class _PageDownload:
+    """Download of a page into a bounded buffer of chunks, in background.
+
+    Iterating it yields the chunks as they arrive, raising the download
+    error, if any.
+
+    :param fetcher: HTTP engine of the run.
+    :type fetcher: fetch.Fetcher
+    :param url: Page url.
+    :type url: str
+    """
+
+    def __init__(self, fetcher, url):
+        self.url = url
+        self._chunks = asyncio.Queue(STREAM_BUFFER_CHUNKS)
+        self._task = asyncio.ensure_future(self._download(fetcher))
+
+    async def _download(self, fetcher):
+        try:
+            with PAGE_FETCH_SECONDS.time():
+                async for chunk in fetcher.stream(self.url):
+                    await self._chunks.put(chunk)
+        except Exception as ex:
+            PAGE_FETCH_ERRORS.inc()
+            logging.error(f'Can not request. {ex}')
+            await self._chunks.put(
+                Exception(f'Can not request "{self.url}".'))
+        else:
+            await self._chunks.put(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self._chunks.get()
+        if chunk is None:
+            raise StopAsyncIteration
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    async def cancel(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def _feed_extractor(extractor, chunk):
+    """Feed a chunk of a page to its extractor, an empty one closes it.
+
+    :param extractor: Extractor of the page.
+    :type extractor: ListingExtractor
+    :param chunk: Page bytes.
+    :type chunk: bytes
+    :return: Threads completed by the chunk.
     :rtype: list
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    try:
+        return extractor.feed_bytes(chunk) if chunk else extractor.close()
+    except Exception as ex:
+        PAGE_PARSE_ERRORS.inc()
+        logging.error(f'Can not parse response. {ex}')
+        raise Exception('Can not parse response.') from None
+
 
-    return _execute_func_concurrent(_request_subreddit, subreddits)
+async def _stream_subreddit(fetcher, subreddit_name, depth=DEFAULT_DEPTH,
+                            top=None, min_upvotes=None, crawl_state=None):
+    """Crawl a subreddit parsing its pages while they download.
 
+    Threads are yielded as soon as their bytes arrive. Unless the crawl
+    may stop early (top and incremental crawls), the next page download
+    starts as soon as the next button is read, overlapping the rest of
+    the current page.
 
-def _get_next_page_url(response):
-    soup = BeautifulSoup(response.content, 'html.parser')
+    :param fetcher: HTTP engine of the run.
+    :type fetcher: fetch.Fetcher
+    :param subreddit_name: Subreddit name.
+    :type subreddit_name: str
+    :param depth: Max number of pages to crawl.
+    :type depth: int
+    :param top: Period of the top listing, one of TOP_PERIODS.
+    :type top: str
+    :param min_upvotes: Min up votes value used to stop top listings.
+    :type min_upvotes: int
+    :param crawl_state: Threads reported before, for incremental crawls.
+    :type crawl_state: state.CrawlState
+    :return: Async generator of (threads, next page url) tuples, the next
+        page url is None but in the last tuple of each page.
+    :rtype: collections.abc.AsyncIterator
+    """
+    prefetch = not top and crawl_state is None
+    download = _PageDownload(
+        fetcher, _get_subreddit_url(subreddit_name, top))
+    next_download = None
     try:
-        next_button = soup.find('span', {'class': 'next-button'})
-        return next_button.find('a').get('href')
-    except Exception:
-        logging.error(f'There is not next button on "{response.url}".')
-        return None
+        for page_number in range(1, depth + 1):
+            extractor = ListingExtractor()
+            items = []
+            scores = {}
+            parse_seconds = 0.0
 
+            async for chunk in download:
+                started_at = time.perf_counter()
+                threads = _feed_extractor(extractor, chunk)
+                parse_seconds += time.perf_counter() - started_at
 
-def _request_concurrent_next_pages(responses, current_page=0):
-    """Request for response next pages concurrently.
+                if threads:
+                    items.extend(threads)
+                    if crawl_state is not None:
+                        # Read before the threads are recorded as reported.
+                        scores.update(crawl_state.get_scores(threads))
+                    yield threads, None
 
-    :param responses: List of requests.Response
-    :type responses: list
-    :return: List of request.Response.
-    :rtype: list
+                if prefetch and next_download is None and \
+                        page_number < depth and extractor.next_page_url:
+                    next_download = _PageDownload(
+                        fetcher, extractor.next_page_url)
+
+            started_at = time.perf_counter()
+            threads = _feed_extractor(extractor, b'')
+            PAGE_PARSE_SECONDS.observe(
+                parse_seconds + time.perf_counter() - started_at)
+            items.extend(threads)
+            if crawl_state is not None:
+                scores.update(crawl_state.get_scores(threads))
+
+            next_page_url = extractor.next_page_url
+            if next_page_url is None:
+                logging.error(
+                    f'There is not next button on "{download.url}".')
+            known = crawl_state is not None and _is_known(
+                items, scores, min_upvotes)
+            yield threads, next_page_url
+
+            if page_number == depth or not next_page_url:
+                break
+
+            if known:
+                logging.info(
+                    f'Page {page_number} of "{subreddit_name}" is already '
+                    f'known.'
+                )
+                break
+
+            if top and min_upvotes is not None and \
+                    _is_below(items, min_upvotes):
+                logging.info(
+                    f'Top of "{subreddit_name}" is below {min_upvotes} '
+                    f'up votes after {page_number} pages.'
+                )
+                break
+
+            download, next_download = \
+                next_download or _PageDownload(fetcher, next_page_url), None
+    finally:
+        for pending in (download, next_download):
+            if pending is not None:
+                await pending.cancel()
+
+
+async def _crawl_subreddit(fetcher, subreddit_name, depth=DEFAULT_DEPTH,
+                           parser=DEFAULT_PARSER, top=None, min_upvotes=None,
+                           backend=DEFAULT_BACKEND, crawl_state=None,
+                           executor=None):
+    """Crawl a subreddit following its own next pages.
+
+    Each next page is requested as soon as the current one is parsed, so
+    a slow subreddit does not hold up the others. Top listings are ordered
+    by score, so they stop once a page has threads below min_upvotes.
+    Incremental crawls stop once a page has nothing to report since the
+    previous crawls. The stream parser parses HTML pages while they
+    download. Errors are raised after the pages crawled before them.
+
+    :param fetcher: HTTP engine of the run.
+    :type fetcher: fetch.Fetcher
+    :param subreddit_name: Subreddit name.
+    :type subreddit_name: str
+    :param depth: Max number of pages to crawl.
+    :type depth: int
+    :param parser: One of PARSERS keys.
+    :type parser: str
+    :param top: Period of the top listing, one of TOP_PERIODS.
+    :type top: str
+    :param min_upvotes: Min up votes value used to stop top listings.
+    :type min_upvotes: int
+    :param backend: One of BACKENDS keys.
+    :type backend: str
+    :param crawl_state: Threads reported before, for incremental crawls.
+    :type crawl_state: state.CrawlState
+    :param executor: Optional process pool parsing the pages.
+    :type executor: concurrent.futures.ProcessPoolExecutor
+    :return: Async generator of (threads, next page url) tuples.
+    :rtype: collections.abc.AsyncIterator
     """
-    if current_page == MAX_PAGES:
-        return responses
+    try:
+        if parser == STREAM_PARSER and backend == 'html':
+            async for page in _stream_subreddit(
+                    fetcher, subreddit_name, depth, top, min_upvotes,
+                    crawl_state):
+                yield page
+            return
 
-    urls = [
-        _get_next_page_url(response)
-        for response in responses
-        if _get_next_page_url(response)
-    ]
-    responses = _execute_func_concurrent(_request_url, urls)
+        response = await _request_subreddit(
+            fetcher, subreddit_name, top, backend)
+        for page_number in range(1, depth + 1):
+            page = await _parse_page(response, parser, backend, executor)
+            items, next_page_url = page
+            known = crawl_state is not None and _is_known(
+                items, crawl_state.get_scores(items), min_upvotes)
+            yield page
+
+            if page_number == depth or not next_page_url:
+                break
+
+            if known:
+                logging.info(
+                    f'Page {page_number} of "{subreddit_name}" is already '
+                    f'known.'
+                )
+                break
+
+            if top and min_upvotes is not None and \
+                    _is_below(items, min_upvotes):
+                logging.info(
+                    f'Top of "{subreddit_name}" is below {min_upvotes} '
+                    f'up votes after {page_number} pages.'
+                )
+                break
+
+            response = await _request_url(fetcher, next_page_url)
+    except Exception as ex:
+        logging.error(f'Can not crawl "{subreddit_name}". {ex}')
+        raise
+
+
+async def _iter_pages(fetcher, subreddits, depth=DEFAULT_DEPTH,
+                      parser=DEFAULT_PARSER, top=None, min_upvotes=None,
+                      backend=DEFAULT_BACKEND, batch_size=DEFAULT_BATCH_SIZE,
+                      crawl_state=None, executor=None, on_done=None):
+    """Crawl each subreddit concurrently yielding pages as they are parsed.
+
+    Subreddits are grouped into combined /r/a+b+c/ listings of batch_size
+    subreddits. Threads keep their own subreddit, and subreddits without
+    threads in the combined ranking are crawled on their own afterwards.
+    Once every page of a listing was consumed, on_done is called with its
+    subreddit names and the set of the ones whose crawl failed.
+
+    :param fetcher: HTTP engine of the run.
+    :type fetcher: fetch.Fetcher
+    :param subreddits: Tuple of subreddits.
+    :type subreddits: tuple
+    :param depth: Max number of pages to crawl per listing.
+    :type depth: int
+    :param parser: One of PARSERS keys.
+    :type parser: str
+    :param top: Period of the top listing, one of TOP_PERIODS.
+    :type top: str
+    :param min_upvotes: Min up votes value used to stop top listings.
+    :type min_upvotes: int
+    :param backend: One of BACKENDS keys.
+    :type backend: str
+    :param batch_size: Max number of subreddits of each listing.
+    :type batch_size: int
+    :param crawl_state: Threads reported before, for incremental crawls.
+    :type crawl_state: state.CrawlState
+    :param executor: Optional process pool parsing the pages.
+    :type executor: concurrent.futures.ProcessPoolExecutor
+    :param on_done: Optional callable receiving a tuple of subreddits and
+        a set of the failed ones.
+    :type on_done: callable
+    :return: Async generator of (threads, next page url) tuples.
+    :rtype: collections.abc.AsyncIterator
+    """
+    queue = asyncio.Queue()
+    done = object()
 
-    return _request_concurrent_next_pages(responses, current_page + 1)
+    async def crawl_listing(subreddit_names):
+        found = set()
+        async for page in _crawl_subreddit(
+                fetcher, '+'.join(subreddit_names), depth, parser, top,
+                min_upvotes, backend, crawl_state, executor):
+            if len(subreddit_names) > 1:
+                items, _ = page
+                found.update(item.subreddit_name for item in items)
+            queue.put_nowait(page)
+        return found
 
+    async def crawl_missing(subreddit_names, found):
+        missing = [
+            subreddit_name for subreddit_name in subreddit_names
+            if subreddit_name.lower() not in found
+        ]
+        if missing:
+            logging.info(
+                f'Crawling {", ".join(missing)} out of the combined '
+                f'listing.'
+            )
+        results = await asyncio.gather(*(
+            crawl_listing((subreddit_name,))
+            for subreddit_name in missing
+        ), return_exceptions=True)
+        return {
+            subreddit_name
+            for subreddit_name, result in zip(missing, results)
+            if isinstance(result, Exception)
+        }
 
-def _unpack(parsed_responses):
-    return [item for items in parsed_responses for item in items]
+    async def crawl(subreddit_names):
+        # Errors are logged by _crawl_subreddit and only reported here.
+        failed = set(subreddit_names)
+        try:
+            found = await crawl_listing(subreddit_names)
+            if len(subreddit_names) == 1:
+                failed = set()
+            else:
+                failed = await crawl_missing(subreddit_names, found)
+        finally:
+            queue.put_nowait((done, subreddit_names, failed))
+
+    tasks = [
+        asyncio.ensure_future(crawl(subreddit_names))
+        for subreddit_names in _plan_batches(subreddits, batch_size)
+    ]
+
+    try:
+        remaining = len(tasks)
+        while remaining:
+            page = await queue.get()
+            if page[0] is done:
+                remaining -= 1
+                if on_done is not None:
+                    on_done(page[1], page[2])
+                continue
+            yield page
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def _filter_by_upvotes(parsed_responses, min_upvotes):
     return list(
         filter(
-            lambda item: item.get('upvotes', 0) >= min_upvotes,
+            lambda item: item.upvotes >= min_upvotes,
             parsed_responses
         )
     )
 
 
-def get_reddits(subreddit_names, min_upvotes=5000):
-    responses = []
-    responses += _request_concurrent(_split_subreddit_names(subreddit_names))
-    responses += _request_concurrent_next_pages(responses)
+async def aiter_reddits(subreddit_names, min_upvotes=5000,
+                        parser=DEFAULT_PARSER, depth=DEFAULT_DEPTH,
+                        concurrency=fetch.DEFAULT_CONCURRENCY, cache=None,
+                        top=None, backend=DEFAULT_BACKEND,
+                        batch_size=DEFAULT_BATCH_SIZE,
+                        rate=fetch.limits.DEFAULT_RATE,
+                        connect_timeout=fetch.DEFAULT_CONNECT_TIMEOUT,
+                        read_timeout=fetch.DEFAULT_READ_TIMEOUT,
+                        retries=fetch.DEFAULT_RETRIES, hedge=False,
+                        hedge_after=None, crawl_state=None,
+                        dedup_links=False,
+                        parse_workers=DEFAULT_PARSE_WORKERS, on_done=None):
+    """Yield threads with enough up votes as soon as each page is parsed.
+
+    Threads seen on several pages or subreddits are yielded once, with the
+    score of their first copy.
+
+    With a crawl state only threads new or with another score since the
+    previous crawls are yielded, and subreddits stop at known pages.
+
+    With a top period the score ordered listing is crawled instead of the
+    hot one, and each subreddit stops at the first page with threads below
+    min_upvotes.
+
+    With more than one parse worker, pages are parsed by a process pool,
+    unless the run has less than PARSE_POOL_MIN_PAGES pages.
+
+    Once every thread of some subreddits was yielded, on_done is called
+    with their names and the set of the ones whose crawl failed, so
+    callers can handle each subreddit while the others are still crawled.
+
+    :param subreddit_names: Name of subbreddits separated by ";".
+    :type subreddit_names: str
+    :param min_upvotes: Min up votes value.
+    :type min_upvotes: int
+    :param parser: One of PARSERS keys.
+    :type parser: str
+    :param depth: Max number of pages to crawl per subreddit.
+    :type depth: int
+    :param concurrency: Max number of in-flight requests.
+    :type concurrency: int
+    :param cache: Optional on disk cache of listing pages.
+    :type cache: cache.HTTPCache
+    :param top: Period of the top listing, one of TOP_PERIODS.
+    :type top: str
+    :param backend: One of BACKENDS keys, html pages or JSON listings.
+    :type backend: str
+    :param batch_size: Max number of subreddits of each combined listing.
+    :type batch_size: int
+    :param rate: Requests per second of each host, 0 disables it.
+    :type rate: float
+    :param connect_timeout: Seconds to wait for a connection.
+    :type connect_timeout: float
+    :param read_timeout: Seconds to wait for each read of a response.
+    :type read_timeout: float
+    :param retries: Max number of retries of a request.
+    :type retries: int
+    :param hedge: If true slow requests are hedged.
+    :type hedge: bool
+    :param hedge_after: Seconds before hedging, None to use the p95.
+    :type hedge_after: float
+    :param crawl_state: Threads reported before, for incremental crawls.
+    :type crawl_state: state.CrawlState
+    :param dedup_links: If true threads with the same link are duplicates.
+    :type dedup_links: bool
+    :param parse_workers: Number of processes parsing pages.
+    :type parse_workers: int
+    :param on_done: Optional callable receiving a tuple of subreddits and
+        a set of the failed ones.
+    :type on_done: callable
+    :return: Async generator of threads.
+    :rtype: collections.abc.AsyncIterator
+    """
+    subreddits = _split_subreddit_names(subreddit_names)
+
+    deduplicator = dedup.Deduplicator(dedup_links)
+
+    if parser == STREAM_PARSER:
+        parse_workers = 1
+
+    with _parse_executor(parse_workers, len(subreddits) * depth) \
+            as executor:
+        async with fetch.Fetcher(
+                concurrency, HEADERS, cache, rate,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                retries=retries,
+                hedge=hedge,
+                hedge_after=hedge_after) as fetcher:
+            pages = _iter_pages(
+                fetcher,
+                subreddits,
+                depth,
+                parser,
+                top,
+                min_upvotes,
+                backend,
+                batch_size,
+                crawl_state,
+                executor,
+                on_done,
+            )
+            try:
+                async for items, _ in pages:
+                    # Duplicates are dropped before the state records
+                    # them, so it keeps the score of the yielded copy.
+                    items = deduplicator.filter(items, min_upvotes)
+                    if crawl_state is not None:
+                        # Threads below min_upvotes are recorded too, so
+                        # the next crawls know the whole page.
+                        items = crawl_state.update(items)
+                    for item in _filter_by_upvotes(items, min_upvotes):
+                        yield item
+            finally:
+                logging.info(
+                    f'Dropped {deduplicator.dropped} duplicated threads.')
+
 
-    parsed_responses = map(_parse_response, responses)
-    parsed_responses = _unpack(parsed_responses)
-    parsed_responses = _filter_by_upvotes(parsed_responses, min_upvotes)
+def iter_reddits(*args, **kwargs):
+    """Synchronous version of aiter_reddits running its own event loop.
 
-    return parsed_responses
+    Accepts the same arguments as aiter_reddits.
+
+    :return: Generator of threads.
+    :rtype: collections.abc.Iterator
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    threads = aiter_reddits(*args, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(threads.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(threads.aclose())
+        loop.close()
+
+
+def get_reddits(*args, **kwargs):
+    """Return every thread with enough up votes.
+
+    Accepts the same arguments as aiter_reddits.
+
+    :return: List of threads.
+    :rtype: list
+    """
+    return list(iter_reddits(*args, **kwargs))
@@ -0,0 +1,136 @@
+import collections
+import logging
+import threading
+import time
+
+DEFAULT_TOP = 10
+DEFAULT_INTERVAL = 45
+DEFAULT_BUDGET = 60
+DEFAULT_REFRESH_COST = 6
+DECAY = 0.5
+
+
+class CacheWarmer:
+    """Background refresher of the results of the most requested subreddits.
+
+    Requests are counted per subreddit and counts decay by half on every
+    cycle, so popularity follows recent traffic. Every interval seconds
+    the top most requested subreddits are refreshed, most requested first,
+    while the estimated requests of the cycle fit the budget. The thread
+    is started on the first recorded request.
+
+    :param refresh: Callable receiving a subreddit name and returning its
+        threads.
+    :type refresh: callable
+    :param top: Max number of subreddits kept warm, 0 disables it.
+    :type top: int
+    :param interval: Seconds between refresh cycles.
+    :type interval: float
+    :param budget: Max number of listing requests of each cycle.
+    :type budget: int
+    :param cost: Max number of listing requests of each refresh.
+    :type cost: int
+    """
+
+    def __init__(self, refresh, top=DEFAULT_TOP, interval=DEFAULT_INTERVAL,
+                 budget=DEFAULT_BUDGET, cost=DEFAULT_REFRESH_COST):
+        self.refresh = refresh
+        self.top = top
+        self.interval = interval
+        self.budget = budget
+        self.cost = cost
+        self._counts = collections.Counter()
+        self._warm = {}
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(
+                target=self._work, name='warmer', daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def stop(self):
+        """Stop refreshing after the current cycle."""
+        self._stopped.set()
+
+    def record(self, subreddits):
+        """Count a request of given subreddits.
+
+        :param subreddits: Normalized subreddit names.
+        :type subreddits: tuple
+        """
+        if self.top <= 0:
+            return
+
+        with self._lock:
+            self._counts.update(subreddits)
+        self._start()
+
+    def get_popular(self):
+        """Return the subreddits to keep warm, most requested first.
+
+        :rtype: list
+        """
+        with self._lock:
+            return [
+                subreddit for subreddit, _ in self._counts.most_common(
+                    min(self.top, self.budget // max(self.cost, 1)))
+            ]
+
+    def run_once(self):
+        """Refresh the popular subreddits, decaying request counts.
+
+        :return: Refreshed subreddits.
+        :rtype: list
+        """
+        refreshed = []
+        for subreddit in self.get_popular():
+            try:
+                threads = self.refresh(subreddit)
+            except Exception as ex:
+                logging.error(f'Can not warm "{subreddit}". {ex}')
+                continue
+
+            refreshed.append(subreddit)
+            with self._lock:
+                self._warm[subreddit] = (time.time(), len(threads))
+
+        with self._lock:
+            for subreddit in list(self._counts):
+                self._counts[subreddit] *= DECAY
+                if self._counts[subreddit] < DECAY:
+                    del self._counts[subreddit]
+
+            for subreddit in set(self._warm) - set(self._counts):
+                del self._warm[subreddit]
+
+        logging.info(f'Warmed {len(refreshed)} subreddits.')
+        return refreshed
+
+    def get_status(self):
+        """Describe the warm subreddits, most requested first.
+
+        :return: Dicts with the subreddit, its decayed request count, the
+            time of its last refresh and its number of threads.
+        :rtype: list
+        """
+        with self._lock:
+            return [
+                {
+                    'subreddit': subreddit,
+                    'requests': self._counts[subreddit],
+                    'refreshed_at': self._warm[subreddit][0],
+                    'threads': self._warm[subreddit][1],
+                }
+                for subreddit, _ in self._counts.most_common()
+                if subreddit in self._warm
+            ]
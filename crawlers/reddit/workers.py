@@ -0,0 +1,169 @@
+import collections
+import logging
+import queue
+import threading
+import time
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_SIZE = 100
+DEFAULT_MAX_KEYS = 1024
+DEFAULT_KEY_RATE = 1.0
+
+
+class WorkQueue:
+    """Bounded queue of items handled by a pool of background threads.
+
+    Threads are started on the first submitted item. When the queue is
+    full new items are refused, so callers can apply backpressure.
+
+    :param handler: Callable receiving each item.
+    :type handler: callable
+    :param workers: Number of worker threads.
+    :type workers: int
+    :param max_size: Max number of waiting items.
+    :type max_size: int
+    """
+
+    def __init__(self, handler, workers=DEFAULT_WORKERS,
+                 max_size=DEFAULT_MAX_SIZE):
+        self.handler = handler
+        self.workers = workers
+        self._queue = queue.Queue(max_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f'worker-{index}',
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self.handler(item)
+            except Exception as ex:
+                logging.error(f'Can not handle queued item. {ex}')
+            finally:
+                self._queue.task_done()
+
+    def submit(self, item):
+        """Enqueue given item without blocking.
+
+        :param item: Item to be handled.
+        :return: False if the queue is full.
+        :rtype: bool
+        """
+        self._start()
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logging.error('Work queue is full.')
+            return False
+
+        return True
+
+    def join(self):
+        """Block until every submitted item is handled."""
+        self._queue.join()
+
+
+class RecentKeys:
+    """Thread safe set remembering only the most recent keys.
+
+    :param max_keys: Max number of remembered keys.
+    :type max_keys: int
+    """
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._keys = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        """Remember given key.
+
+        :param key: Hashable key.
+        :return: False if the key was already remembered.
+        :rtype: bool
+        """
+        with self._lock:
+            if key in self._keys:
+                return False
+
+            self._keys[key] = None
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+
+            return True
+
+    def discard(self, key):
+        """Forget given key.
+
+        :param key: Hashable key.
+        """
+        with self._lock:
+            self._keys.pop(key, None)
+
+
+class KeyRateLimiter:
+    """Thread safe limiter of the rate of calls made for each key.
+
+    Slots are reserved in call order, so concurrent callers of the same key
+    are spaced by 1 / rate seconds. Only the most recent keys are
+    remembered.
+
+    :param rate: Calls per second of each key, 0 disables it.
+    :type rate: float
+    :param max_keys: Max number of remembered keys.
+    :type max_keys: int
+    """
+
+    def __init__(self, rate=DEFAULT_KEY_RATE, max_keys=DEFAULT_MAX_KEYS):
+        self.rate = rate
+        self.max_keys = max_keys
+        self._next_at = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def wait(self, key):
+        """Block until a call for given key is allowed.
+
+        :param key: Hashable key.
+        :return: Seconds waited.
+        :rtype: float
+        """
+        interval = 1 / self.rate if self.rate > 0 else 0.0
+        with self._lock:
+            now = time.monotonic()
+            allowed_at = max(now, self._next_at.get(key, now))
+            self._next_at[key] = allowed_at + interval
+            self._next_at.move_to_end(key)
+            while len(self._next_at) > self.max_keys:
+                self._next_at.popitem(last=False)
+
+        delay = allowed_at - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def delay(self, key, seconds):
+        """Hold the calls of given key for at least seconds.
+
+        :param key: Hashable key.
+        :param seconds: Seconds from now before the next call.
+        :type seconds: float
+        """
+        with self._lock:
+            allowed_at = time.monotonic() + seconds
+            self._next_at[key] = max(self._next_at.get(key, 0), allowed_at)
+            self._next_at.move_to_end(key)
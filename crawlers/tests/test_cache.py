@@ -0,0 +1,96 @@
+import os
+
+from reddit import cache, fetch
+
+URL = 'https://old.reddit.com/r/cats/'
+
+
+def _response(content=b'content', headers=None):
+    return fetch.Response(URL, 200, headers or {}, content)
+
+
+class TestHTTPCache:
+    def test_must_return_stored_response(self, tmpdir):
+        http_cache = cache.HTTPCache(str(tmpdir))
+        http_cache.store(URL, _response(headers={'etag': '"a"'}))
+
+        entry = http_cache.get(URL)
+
+        assert entry.url == URL
+        assert entry.status == 200
+        assert entry.headers == {'etag': '"a"'}
+        assert entry.content == b'content'
+
+    def test_must_return_none_for_unknown_url(self, tmpdir):
+        assert cache.HTTPCache(str(tmpdir)).get(URL) is None
+
+    def test_must_not_return_entries_when_refreshing(self, tmpdir):
+        cache.HTTPCache(str(tmpdir)).store(URL, _response())
+
+        assert cache.HTTPCache(str(tmpdir), refresh=True).get(URL) is None
+
+    def test_must_check_freshness_with_ttl(self, tmpdir, mocker):
+        http_cache = cache.HTTPCache(str(tmpdir), ttl=10)
+        http_cache.store(URL, _response())
+        entry = http_cache.get(URL)
+
+        mocker.patch('time.time', return_value=entry.stored_at + 9)
+        assert http_cache.is_fresh(entry) is True
+
+        mocker.patch('time.time', return_value=entry.stored_at + 10)
+        assert http_cache.is_fresh(entry) is False
+
+    def test_must_return_validators(self, tmpdir):
+        http_cache = cache.HTTPCache(str(tmpdir))
+        http_cache.store(URL, _response(headers={
+            'etag': '"a"',
+            'last-modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+        }))
+
+        assert http_cache.get_validators(http_cache.get(URL)) == {
+            'If-None-Match': '"a"',
+            'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+        }
+
+    def test_must_evict_least_recently_used_entries(self, tmpdir):
+        http_cache = cache.HTTPCache(str(tmpdir), max_size=2500)
+        urls = [f'{URL}?page={page}' for page in range(3)]
+
+        for index, url in enumerate(urls[:2]):
+            http_cache.store(url, _response(b'x' * 1000))
+            os.utime(http_cache._get_path(url), (index, index))
+
+        http_cache.get(urls[0])
+        http_cache.store(urls[2], _response(b'x' * 1000))
+
+        assert http_cache.get(urls[0]) is not None
+        assert http_cache.get(urls[1]) is None
+        assert http_cache.get(urls[2]) is not None
+
+    def test_must_only_scan_directory_when_evicting(self, tmpdir, mocker):
+        http_cache = cache.HTTPCache(str(tmpdir), max_size=2500)
+        http_cache.store(f'{URL}?page=0', _response(b'x' * 1000))
+        scandir = mocker.spy(os, 'scandir')
+
+        http_cache.store(f'{URL}?page=1', _response(b'x' * 1000))
+        http_cache.store(f'{URL}?page=1', _response(b'x' * 1000))
+        assert scandir.call_count == 0
+
+        http_cache.store(f'{URL}?page=2', _response(b'x' * 1000))
+        assert scandir.call_count == 1
+
+    def test_must_skip_entries_removed_while_scanning(self, tmpdir, mocker):
+        http_cache = cache.HTTPCache(str(tmpdir), max_size=1500)
+        http_cache.store(f'{URL}?page=0', _response(b'x' * 1000))
+        os.utime(http_cache._get_path(f'{URL}?page=0'), (0, 0))
+        removed = mocker.Mock()
+        removed.name = 'removed.cache'
+        removed.stat.side_effect = FileNotFoundError
+        scandir = os.scandir
+        mocker.patch('os.scandir', side_effect=lambda directory:
+                     [removed] + list(scandir(directory)))
+
+        http_cache.store(f'{URL}?page=1', _response(b'x' * 1000))
+
+        assert http_cache.get(f'{URL}?page=0') is None
+        assert http_cache.get(f'{URL}?page=1') is not None
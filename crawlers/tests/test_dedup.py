@@ -0,0 +1,60 @@
+import pytest
+
+from reddit import dedup, utils
+
+
+def _thread(thread_id, upvotes, link=None):
+    return utils.Thread(
+        thread_id, link or f'https://i.imgur.com/{thread_id}.jpg', upvotes,
+        f'/r/cats/comments/{thread_id}/title/', 'cats')
+
+
+class TestGetCanonicalLink:
+    @pytest.mark.parametrize('link', (
+        'https://www.Imgur.com/a/',
+        'http://imgur.com/a#top',
+        'https://imgur.com/a',
+    ))
+    def test_must_normalize_link(self, link):
+        assert dedup.get_canonical_link(link) == '//imgur.com/a'
+
+
+class TestDeduplicator:
+    def test_must_drop_threads_seen_before(self):
+        deduplicator = dedup.Deduplicator()
+
+        assert deduplicator.filter([_thread('a', 1), _thread('a', 1)]) == \
+            [_thread('a', 1)]
+        assert deduplicator.filter([_thread('a', 1), _thread('b', 1)]) == \
+            [_thread('b', 1)]
+        assert deduplicator.dropped == 2
+
+    def test_must_not_change_reported_threads(self):
+        deduplicator = dedup.Deduplicator()
+        threads = deduplicator.filter([_thread('a', 10)])
+
+        assert deduplicator.filter([_thread('a', 30), _thread('a', 20)]) == []
+        assert threads == [_thread('a', 10)]
+
+    def test_must_not_remember_threads_below_min_upvotes(self):
+        deduplicator = dedup.Deduplicator()
+
+        assert deduplicator.filter([_thread('a', 5)], 10) == \
+            [_thread('a', 5)]
+        assert deduplicator.filter([_thread('a', 20), _thread('a', 5)],
+                                   10) == [_thread('a', 20)]
+        assert deduplicator.dropped == 1
+
+    def test_must_drop_same_links_only_when_asked(self):
+        threads = [_thread('a', 1, 'https://x.com/'),
+                   _thread('b', 1, 'https://www.x.com')]
+
+        assert len(dedup.Deduplicator().filter(threads)) == 2
+        assert len(dedup.Deduplicator(links=True).filter(threads)) == 1
+
+    def test_must_forget_oldest_keys(self):
+        deduplicator = dedup.Deduplicator(max_keys=2)
+        deduplicator.filter([_thread('a', 1), _thread('b', 1),
+                             _thread('c', 1)])
+
+        assert deduplicator.filter([_thread('a', 1)]) == [_thread('a', 1)]
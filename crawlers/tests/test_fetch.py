@@ -0,0 +1,375 @@
+import asyncio
+import os
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from reddit import cache, fetch
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+class TestFetcher:
+    def test_must_return_response(self):
+        async def handler(request):
+            return web.Response(
+                body=b'content', headers={'ETag': '"abc"'})
+
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher() as fetcher:
+                    return await fetcher.get(f'{base_url}/r/cats/')
+            finally:
+                await runner.cleanup()
+
+        response = asyncio.run(run())
+
+        assert response.status == 200
+        assert response.content == b'content'
+        assert response.url.endswith('/r/cats/')
+        assert response.headers['etag'] == '"abc"'
+
+    def test_must_send_headers(self):
+        received = []
+
+        async def handler(request):
+            received.append(request.headers.get('User-Agent'))
+            return web.Response(body=b'')
+
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(
+                        headers={'User-Agent': 'tester'}) as fetcher:
+                    await fetcher.get(base_url)
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(run())
+
+        assert received == ['tester']
+
+    def test_must_reuse_connections(self):
+        peers = set()
+
+        async def handler(request):
+            peers.add(request.transport.get_extra_info('peername'))
+            return web.Response(body=b'')
+
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(concurrency=1) as fetcher:
+                    for _ in range(3):
+                        await fetcher.get(base_url)
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(run())
+
+        assert len(peers) == 1
+
+
+class TestFetcherCache:
+    @staticmethod
+    def _fetch(http_cache, handler, times=1):
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(cache=http_cache) as fetcher:
+                    return [
+                        await fetcher.get(f'{base_url}/r/cats/')
+                        for _ in range(times)
+                    ]
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(run())
+
+    def test_must_serve_fresh_entries_without_requests(self, tmpdir):
+        requests = []
+
+        async def handler(request):
+            requests.append(request)
+            return web.Response(body=b'content')
+
+        responses = self._fetch(cache.HTTPCache(str(tmpdir)), handler, 2)
+
+        assert len(requests) == 1
+        assert [response.content for response in responses] == \
+            [b'content', b'content']
+
+    def test_must_revalidate_stale_entries(self, tmpdir):
+        conditions = []
+
+        async def handler(request):
+            conditions.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return web.Response(status=304)
+            return web.Response(body=b'content', headers={'ETag': '"v1"'})
+
+        responses = self._fetch(
+            cache.HTTPCache(str(tmpdir), ttl=0), handler, 2)
+
+        assert conditions == [None, '"v1"']
+        assert [response.status for response in responses] == [200, 200]
+        assert responses[1].content == b'content'
+
+    def test_must_not_store_errors(self, tmpdir):
+        async def handler(request):
+            return web.Response(status=503)
+
+        http_cache = cache.HTTPCache(str(tmpdir))
+        self._fetch(http_cache, handler)
+
+        assert os.listdir(str(tmpdir)) == []
+
+
+class TestFetcherLimits:
+    def test_must_back_off_on_throttling(self):
+        async def handler(request):
+            return web.Response(status=429, headers={'Retry-After': '0'})
+
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(
+                        concurrency=8, retries=0) as fetcher:
+                    response = await fetcher.get(base_url)
+                    return response, fetcher.limiter.get(base_url)
+            finally:
+                await runner.cleanup()
+
+        response, host_limit = asyncio.run(run())
+
+        assert response.status == 429
+        assert host_limit.concurrency == 2
+        assert host_limit.in_flight == 0
+
+
+class TestFetcherRetries:
+    @staticmethod
+    def _fetch(handler, **options):
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(rate=0, **options) as fetcher:
+                    try:
+                        return await fetcher.get(base_url), fetcher.stats
+                    except Exception as ex:
+                        return ex, fetcher.stats
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(run())
+
+    def test_must_retry_throttled_requests(self, mocker):
+        mocker.patch('random.uniform', return_value=0)
+        statuses = [503, 429, 200]
+
+        async def handler(request):
+            return web.Response(status=statuses.pop(0))
+
+        response, stats = self._fetch(handler)
+
+        assert response.status == 200
+        assert stats.requests == 3
+        assert stats.retries == 2
+
+    def test_must_return_last_response_without_retries_left(self, mocker):
+        mocker.patch('random.uniform', return_value=0)
+
+        async def handler(request):
+            return web.Response(status=503)
+
+        response, stats = self._fetch(handler, retries=1)
+
+        assert response.status == 503
+        assert stats.requests == 2
+
+    def test_must_not_retry_client_errors(self):
+        async def handler(request):
+            return web.Response(status=404)
+
+        response, stats = self._fetch(handler)
+
+        assert response.status == 404
+        assert stats.retries == 0
+
+    def test_must_time_out_stuck_requests(self, mocker):
+        mocker.patch('random.uniform', return_value=0)
+
+        async def handler(request):
+            await asyncio.sleep(1)
+            return web.Response()
+
+        error, stats = self._fetch(handler, read_timeout=0.05, retries=1)
+
+        assert isinstance(error, asyncio.TimeoutError)
+        assert stats.timeouts == 2
+        assert stats.retries == 1
+
+    def test_must_hedge_slow_requests(self):
+        delays = [1, 0]
+
+        async def handler(request):
+            await asyncio.sleep(delays.pop(0))
+            return web.Response(body=b'content')
+
+        response, stats = self._fetch(handler, hedge=True, hedge_after=0.05)
+
+        assert response.content == b'content'
+        assert stats.hedges == 1
+        assert stats.hedge_wins == 1
+
+    def test_must_not_hedge_without_latency_samples(self):
+        async def handler(request):
+            return web.Response()
+
+        _, stats = self._fetch(handler, hedge=True)
+
+        assert stats.hedges == 0
+
+
+class TestFetcherStream:
+    @staticmethod
+    def _stream(handler, http_cache=None, times=1, **options):
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(
+                        cache=http_cache, **options) as fetcher:
+                    for _ in range(times):
+                        chunks = [chunk async for chunk in fetcher.stream(
+                            f'{base_url}/r/cats/', chunk_size=4)]
+                    return chunks, fetcher.limiter.get(base_url)
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(run())
+
+    def test_must_yield_content_chunks(self):
+        async def handler(request):
+            return web.Response(body=b'0123456789')
+
+        chunks, host_limit = self._stream(handler)
+
+        assert chunks == [b'0123', b'4567', b'89']
+        assert host_limit.in_flight == 0
+
+    def test_must_raise_error_statuses(self):
+        async def handler(request):
+            return web.Response(status=404)
+
+        with pytest.raises(aiohttp.ClientResponseError):
+            self._stream(handler)
+
+    def test_must_retry_throttled_requests(self, mocker):
+        mocker.patch('random.uniform', return_value=0)
+        statuses = [503, 429, 200]
+
+        async def handler(request):
+            return web.Response(status=statuses.pop(0), body=b'content')
+
+        chunks, host_limit = self._stream(handler, rate=0)
+
+        assert chunks == [b'cont', b'ent']
+        assert statuses == []
+        assert host_limit.in_flight == 0
+
+    def test_must_raise_last_error_status_without_retries_left(
+            self, mocker):
+        mocker.patch('random.uniform', return_value=0)
+        requests = []
+
+        async def handler(request):
+            requests.append(request)
+            return web.Response(status=503)
+
+        with pytest.raises(aiohttp.ClientResponseError):
+            self._stream(handler, rate=0, retries=1)
+        assert len(requests) == 2
+
+    def test_must_hedge_slow_requests(self):
+        delays = [1, 0]
+
+        async def handler(request):
+            await asyncio.sleep(delays.pop(0))
+            return web.Response(body=b'content')
+
+        chunks, host_limit = self._stream(
+            handler, hedge=True, hedge_after=0.05)
+
+        assert chunks == [b'cont', b'ent']
+        assert host_limit.in_flight == 0
+
+    def test_must_serve_fresh_entries_whole(self, tmpdir):
+        requests = []
+
+        async def handler(request):
+            requests.append(request)
+            return web.Response(body=b'0123456789')
+
+        async def run():
+            runner, base_url = await _serve(handler)
+            try:
+                async with fetch.Fetcher(
+                        cache=cache.HTTPCache(str(tmpdir))) as fetcher:
+                    await fetcher.get(f'{base_url}/r/cats/')
+                    return [chunk async for chunk in fetcher.stream(
+                        f'{base_url}/r/cats/', chunk_size=4)]
+            finally:
+                await runner.cleanup()
+
+        assert asyncio.run(run()) == [b'0123456789']
+        assert len(requests) == 1
+
+    def test_must_store_complete_streams(self, tmpdir):
+        requests = []
+
+        async def handler(request):
+            requests.append(request)
+            return web.Response(body=b'content')
+
+        chunks, _ = self._stream(
+            handler, cache.HTTPCache(str(tmpdir)), times=2)
+
+        assert chunks == [b'content']
+        assert len(requests) == 1
+
+    def test_must_revalidate_stale_entries(self, tmpdir):
+        conditions = []
+
+        async def handler(request):
+            conditions.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return web.Response(status=304)
+            return web.Response(body=b'content', headers={'ETag': '"v1"'})
+
+        chunks, host_limit = self._stream(
+            handler, cache.HTTPCache(str(tmpdir), ttl=0), times=2)
+
+        assert conditions == [None, '"v1"']
+        assert chunks == [b'content']
+        assert host_limit.in_flight == 0
+
+
+class TestFetchStats:
+    def test_must_return_percentiles(self):
+        stats = fetch.FetchStats()
+        stats.latencies.extend(range(100))
+
+        assert stats.get_percentile(0.95) == 95
+        assert stats.get_percentile(0.5) == 50
+        assert fetch.FetchStats().get_percentile(0.95) is None
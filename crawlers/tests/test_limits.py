@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from reddit import limits
+
+
+def _run(host_limit, *statuses):
+    async def run():
+        for status in statuses:
+            await host_limit.acquire()
+            await host_limit.release(*status)
+
+    asyncio.run(run())
+
+
+class TestParseRetryAfter:
+    @pytest.mark.parametrize('value, expected_seconds', (
+        ('120', 120),
+        ('0', 0),
+        ('', None),
+        ('soon', None),
+        ('Wed, 21 Oct 2015 07:28:00 GMT', 0),
+    ))
+    def test_must_return_seconds(self, value, expected_seconds):
+        assert limits._parse_retry_after(value) == expected_seconds
+
+
+class TestHostLimit:
+    def test_must_grow_concurrency_after_healthy_window(self):
+        host_limit = limits.HostLimit('reddit', 0, 8, 2)
+
+        _run(host_limit, *[(200,)] * 2)
+        assert host_limit.concurrency == 3
+
+        _run(host_limit, *[(200,)] * 3)
+        assert host_limit.concurrency == 4
+
+    def test_must_not_grow_over_max_concurrency(self):
+        host_limit = limits.HostLimit('reddit', 0, 2, 2)
+
+        _run(host_limit, *[(200,)] * 10)
+
+        assert host_limit.concurrency == 2
+
+    @pytest.mark.parametrize('status', (429, 500, 503, None))
+    def test_must_halve_concurrency_when_unhealthy(self, status):
+        host_limit = limits.HostLimit('reddit', 0, 16, 8)
+
+        _run(host_limit, (status,))
+
+        assert host_limit.concurrency == 4
+        assert host_limit.in_flight == 0
+
+    def test_must_pause_on_retry_after(self, mocker):
+        host_limit = limits.HostLimit('reddit', 0, 16, 8)
+        mocker.patch('time.monotonic', return_value=100)
+
+        _run(host_limit, (429, {'retry-after': '30'}))
+
+        assert host_limit.paused_until == 130
+        assert host_limit._take_token() == 30
+
+    def test_must_wait_for_tokens(self, mocker):
+        monotonic = mocker.patch('time.monotonic', return_value=100)
+        host_limit = limits.HostLimit('reddit', rate=2)
+
+        assert host_limit._take_token() == 0
+        assert host_limit._take_token() == 0
+        assert host_limit._take_token() == 0.5
+
+        monotonic.return_value = 100.5
+        assert host_limit._take_token() == 0
+
+    def test_must_limit_in_flight_requests(self):
+        host_limit = limits.HostLimit('reddit', 0, 1, 1)
+        events = []
+
+        async def request(name):
+            await host_limit.acquire()
+            events.append(f'{name} start')
+            await asyncio.sleep(0.01)
+            events.append(f'{name} end')
+            await host_limit.release(200)
+
+        async def run():
+            await asyncio.gather(request('a'), request('b'))
+
+        asyncio.run(run())
+
+        assert events == ['a start', 'a end', 'b start', 'b end']
+
+
+class TestRateLimiter:
+    def test_must_share_limits_per_host(self):
+        limiter = limits.RateLimiter()
+
+        assert limiter.get('https://old.reddit.com/r/cats/') is \
+            limiter.get('https://old.reddit.com/r/dogs/')
+        assert limiter.get('https://old.reddit.com/') is not \
+            limiter.get('https://api.telegram.org/')
@@ -0,0 +1,50 @@
+from reddit import metrics
+
+
+class TestCounter:
+    def test_must_render_value(self):
+        registry = metrics.Registry()
+        counter = metrics.Counter('requests_total', 'Requests.', registry)
+        counter.inc()
+        counter.inc(2)
+
+        assert registry.render() == \
+            '# HELP requests_total Requests.\n' \
+            '# TYPE requests_total counter\n' \
+            'requests_total 3\n'
+
+
+class TestGauge:
+    def test_must_track_in_progress_blocks(self):
+        gauge = metrics.Gauge('in_flight', 'In flight.', metrics.Registry())
+
+        with gauge.track_in_progress():
+            assert gauge.value == 1
+
+        assert gauge.value == 0
+
+
+class TestHistogram:
+    def test_must_render_cumulative_buckets(self):
+        registry = metrics.Registry()
+        histogram = metrics.Histogram(
+            'latency_seconds', 'Latency.', (0.1, 1), registry)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+
+        assert registry.render().splitlines()[2:] == [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_sum 3.65',
+            'latency_seconds_count 4',
+        ]
+
+    def test_must_time_blocks(self, mocker):
+        mocker.patch('time.perf_counter', side_effect=[10, 10.5])
+        histogram = metrics.Histogram('x', 'X.', registry=metrics.Registry())
+
+        with histogram.time():
+            pass
+
+        assert histogram.sum == 0.5
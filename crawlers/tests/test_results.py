@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from reddit import results
+
+
+class TestResultCache:
+    def test_must_return_cached_result(self):
+        cache = results.ResultCache()
+        cache.set('key', ['thread'])
+
+        assert cache.get('key') == ['thread']
+
+    def test_must_expire_results(self, mocker):
+        monotonic = mocker.patch('time.monotonic', return_value=100)
+        cache = results.ResultCache(ttl=10)
+        cache.set('key', ['thread'])
+
+        monotonic.return_value = 109
+        assert cache.get('key') == ['thread']
+
+        monotonic.return_value = 110
+        assert cache.get('key') is None
+
+    def test_must_drop_least_recently_used_results(self):
+        cache = results.ResultCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+    def test_must_compute_missing_results_once(self, mocker):
+        cache = results.ResultCache()
+        compute = mocker.Mock(return_value=[])
+
+        assert cache.get_or_compute('key', compute) == []
+        assert cache.get_or_compute('key', compute) == []
+        assert compute.call_count == 1
+
+    def test_must_share_in_flight_computations(self):
+        cache = results.ResultCache()
+        started = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return ['thread']
+
+        values = []
+
+        def worker():
+            values.append(cache.get_or_compute('key', compute))
+
+        threads = [threading.Thread(target=worker)]
+        threads[0].start()
+        started.wait()
+        threads += [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert calls == [1]
+        assert values == [['thread']] * 5
+
+    def test_must_not_cache_errors(self, mocker):
+        cache = results.ResultCache()
+
+        with pytest.raises(ValueError):
+            cache.get_or_compute('key', mocker.Mock(side_effect=ValueError))
+
+        assert cache.get_or_compute('key', lambda: ['thread']) == ['thread']
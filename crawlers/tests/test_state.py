@@ -0,0 +1,32 @@
+from reddit import state, utils
+
+
+def _thread(thread_id, upvotes, subreddit='Cats'):
+    return utils.Thread(thread_id, f'https://i.imgur.com/{thread_id}.jpg',
+                        upvotes, f'/r/{subreddit}/comments/{thread_id}/title/',
+                        subreddit)
+
+
+class TestCrawlState:
+    def test_must_return_new_and_changed_threads(self):
+        crawl_state = state.CrawlState(':memory:')
+
+        assert crawl_state.update([_thread('a', 1), _thread('b', 2)]) == \
+            [_thread('a', 1), _thread('b', 2)]
+        assert crawl_state.update([_thread('a', 1), _thread('b', 3)]) == \
+            [_thread('b', 3)]
+
+    def test_must_return_known_scores(self):
+        crawl_state = state.CrawlState(':memory:')
+        crawl_state.update([_thread('a', 1)])
+
+        assert crawl_state.get_scores([_thread('a', 5), _thread('b', 2)]) \
+            == {'t3_a': 1}
+
+    def test_must_persist_state(self, tmpdir):
+        path = str(tmpdir.join('state', 'state.sqlite3'))
+        crawl_state = state.CrawlState(path)
+        crawl_state.update([_thread('a', 1)])
+        crawl_state.close()
+
+        assert state.CrawlState(path).update([_thread('a', 1)]) == []
@@ -0,0 +1,364 @@
+import subprocess
+import sys
+import threading
+
+import reddit
+from reddit import telegram, utils, warmer
+
+BOT_TOKEN = 'token'
+
+
+def _patch_state(mocker, **attributes):
+    bot = telegram.BotState()
+    for name, value in attributes.items():
+        setattr(bot, name, value)
+    mocker.patch.object(telegram, '_get_state', return_value=bot)
+    return bot
+
+
+def _create_app(monkeypatch):
+    monkeypatch.setenv('BOT_TOKEN', BOT_TOKEN)
+    return telegram.create_app()
+
+
+def _thread(subreddit):
+    return utils.Thread('Title', 'https://i.imgur.com/a.jpg', 6000,
+                        f'/r/{subreddit}/comments/a/title/', subreddit)
+
+
+def _iter_reddits(subreddit_names, *args, on_done, **kwargs):
+    for subreddit in subreddit_names.split(';'):
+        yield _thread(subreddit)
+        on_done((subreddit,), set())
+
+
+class TestGetReddits:
+    def test_must_share_results_of_equivalent_requests(self, mocker):
+        bot = _patch_state(mocker, warmer=mocker.Mock())
+        iter_reddits = mocker.patch('reddit.utils.iter_reddits',
+                                    side_effect=_iter_reddits)
+
+        expected = {'cats': [_thread('cats')], 'dogs': [_thread('dogs')]}
+        assert telegram._get_reddits('Cats;dogs') == expected
+        assert telegram._get_reddits('dogs;cats;') == expected
+
+        assert iter_reddits.call_count == 1
+        assert iter_reddits.call_args == mocker.call(
+            'cats;dogs', telegram.MIN_UPVOTES, cache=bot.http_cache,
+            on_done=mocker.ANY)
+
+    def test_must_not_share_results_of_other_min_upvotes(self, mocker):
+        _patch_state(mocker, warmer=mocker.Mock())
+        iter_reddits = mocker.patch('reddit.utils.iter_reddits',
+                                    side_effect=_iter_reddits)
+
+        telegram._get_reddits('cats', 10)
+        telegram._get_reddits('cats', 20)
+
+        assert iter_reddits.call_count == 2
+
+    def test_must_record_requests_for_the_warmer(self, mocker):
+        bot = _patch_state(mocker)
+        record = mocker.patch.object(bot.warmer, 'record')
+        mocker.patch('reddit.utils.iter_reddits', side_effect=_iter_reddits)
+
+        telegram._get_reddits('Dogs;cats')
+
+        assert record.call_args == mocker.call(('cats', 'dogs'))
+
+    def test_must_crawl_only_subreddits_without_results(self, mocker):
+        _patch_state(mocker, warmer=mocker.Mock())
+        mocker.patch('reddit.utils.get_reddits',
+                     side_effect=lambda name, *args, **kwargs:
+                     [_thread(name)])
+        iter_reddits = mocker.patch('reddit.utils.iter_reddits',
+                                    side_effect=_iter_reddits)
+        sent = []
+
+        telegram._warm('cats')
+        threads = telegram._get_reddits(
+            'dogs;cats', send=lambda subreddit, threads: sent.append(
+                (subreddit, threads)))
+
+        assert threads == {'cats': [_thread('cats')],
+                           'dogs': [_thread('dogs')]}
+        assert sent == [('cats', [_thread('cats')]),
+                        ('dogs', [_thread('dogs')])]
+        assert iter_reddits.call_args[0][0] == 'dogs'
+
+
+class TestWarmStatus:
+    def test_must_list_warm_subreddits(self, mocker, monkeypatch):
+        cache_warmer = warmer.CacheWarmer(lambda subreddit: ['thread'])
+        _patch_state(mocker, warmer=cache_warmer)
+        mocker.patch.object(cache_warmer, '_start')
+        cache_warmer.record(('cats',))
+        cache_warmer.run_once()
+
+        response = _create_app(monkeypatch).test_client().get('/warm')
+
+        assert response.status_code == 200
+        assert [
+            (entry['subreddit'], entry['threads'])
+            for entry in response.get_json()
+        ] == [('cats', 1)]
+
+
+class TestWarm:
+    def test_must_keep_previous_result_when_refresh_fails(self, mocker):
+        iter_reddits = utils.iter_reddits
+        cache_warmer = warmer.CacheWarmer(telegram._warm)
+        bot = _patch_state(mocker, warmer=cache_warmer)
+        mocker.patch.object(cache_warmer, '_start')
+        mocker.patch('reddit.utils.iter_reddits', side_effect=_iter_reddits)
+        cache_warmer.record(('cats',))
+        cache_warmer.run_once()
+
+        mocker.patch('reddit.utils.iter_reddits', new=iter_reddits)
+        mocker.patch.object(utils.fetch.Fetcher, 'get',
+                            side_effect=Exception('Throttled.'))
+        cache_warmer.record(('cats',))
+
+        assert cache_warmer.run_once() == []
+        assert bot.results.get((('cats',), telegram.MIN_UPVOTES)) == \
+            {'cats': [_thread('cats')]}
+        assert cache_warmer.get_status()[0]['threads'] == 1
+
+
+class TestRenderThreads:
+    def test_must_render_threads_by_upvotes(self):
+        threads = [
+            utils.Thread('Kitten', '/r/cats/comments/b2/kitten/', 5001,
+                         '/r/cats/comments/b2/kitten/', 'cats'),
+            utils.Thread('Cat', 'https://i.imgur.com/a1.jpg', 6000,
+                         '/r/cats/comments/a1/cat/', 'cats'),
+        ]
+
+        assert telegram._render_threads('cats', threads) == (
+            'r/cats: 2 threads\n\n'
+            '6000 | Cat\n'
+            'https://i.imgur.com/a1.jpg\n'
+            'Comentários: https://old.reddit.com/r/cats/comments/a1/cat/\n\n'
+            '5001 | Kitten\n'
+            'https://old.reddit.com/r/cats/comments/b2/kitten/\n'
+            'Comentários: https://old.reddit.com/r/cats/comments/b2/kitten/'
+        )
+
+    def test_must_render_empty_results(self):
+        assert telegram._render_threads('cats', []).startswith('r/cats: ')
+
+
+class TestSplitMessage:
+    def test_must_split_between_blocks(self):
+        text = '\n\n'.join(['a' * 4, 'b' * 4, 'c' * 4])
+
+        assert telegram._split_message(text, 10) == \
+            ['aaaa\n\nbbbb', 'cccc']
+
+    def test_must_cut_long_blocks(self):
+        messages = telegram._split_message('a' * 25 + '\n\nb', 10)
+
+        assert messages == ['a' * 10, 'a' * 10, 'a' * 5 + '\n\nb']
+        assert all(len(message) <= 10 for message in messages)
+
+
+class TestSendAnswer:
+    @staticmethod
+    def _update(text):
+        return {'message': {'text': text, 'from': {'id': 1}}}
+
+    def test_must_send_each_subreddit_as_soon_as_it_is_done(self, mocker):
+        _patch_state(mocker, warmer=mocker.Mock())
+        fast_sent = threading.Event()
+
+        def iter_reddits(subreddit_names, *args, on_done, **kwargs):
+            yield _thread('fast')
+            on_done(('fast',), set())
+            assert fast_sent.wait(1)
+            yield _thread('slow')
+            on_done(('slow',), set())
+
+        mocker.patch('reddit.utils.iter_reddits', side_effect=iter_reddits)
+        _send_message = mocker.patch.object(
+            telegram, '_send_message',
+            side_effect=lambda chat_id, text: fast_sent.set())
+
+        telegram._send_answer(self._update('/NadaPraFazer Slow;fast'))
+
+        assert [call[0][1].split(':')[0]
+                for call in _send_message.call_args_list] == \
+            ['r/fast', 'r/slow']
+
+    def test_must_report_failed_subreddits(self, mocker):
+        _patch_state(mocker, warmer=mocker.Mock())
+
+        def iter_reddits(subreddit_names, *args, on_done, **kwargs):
+            yield _thread('cats')
+            on_done(('cats',), set())
+            raise Exception
+
+        mocker.patch('reddit.utils.iter_reddits', side_effect=iter_reddits)
+        _send_message = mocker.patch.object(telegram, '_send_message')
+
+        telegram._send_answer(self._update('/NadaPraFazer cats;dogs'))
+
+        assert [call[0][1] for call in _send_message.call_args_list] == [
+            telegram._render_threads('cats', [_thread('cats')]),
+            'r/dogs: não foi possível buscar os threads.',
+        ]
+
+    def test_must_report_subreddits_that_can_not_be_fetched(self, mocker):
+        bot = _patch_state(mocker, warmer=mocker.Mock())
+        mocker.patch.object(utils.fetch.Fetcher, 'get',
+                            side_effect=Exception('Reset.'))
+        _send_message = mocker.patch.object(telegram, '_send_message')
+
+        telegram._send_answer(self._update('/NadaPraFazer cats'))
+
+        assert _send_message.call_args == mocker.call(
+            1, 'r/cats: não foi possível buscar os threads.')
+        assert bot.results.get((('cats',), telegram.MIN_UPVOTES)) is None
+
+    def test_must_send_example_without_subreddits(self, mocker):
+        _send_message = mocker.patch.object(telegram, '_send_message')
+
+        telegram._send_answer(self._update('/NadaPraFazer ;'))
+
+        assert _send_message.call_args == \
+            mocker.call(1, 'Exemplo: /NadaPraFazer cats;dogs')
+
+
+class TestSendMessage:
+    def test_must_send_again_throttled_messages(self, mocker, monkeypatch):
+        monkeypatch.setenv('BOT_TOKEN', BOT_TOKEN)
+        throttled = mocker.Mock(status_code=429)
+        throttled.json.return_value = {'parameters': {'retry_after': 2}}
+        limiter = mocker.Mock()
+        bot = _patch_state(mocker, chat_limiter=limiter)
+        post = mocker.patch.object(
+            bot.session, 'post',
+            side_effect=[throttled, mocker.Mock(status_code=200)])
+
+        telegram._send_message(1, 'text')
+
+        assert post.call_count == 2
+        assert limiter.delay.call_args == mocker.call(1, 2)
+        assert limiter.wait.call_count == 2
+
+
+class TestProcessUpdate:
+    @staticmethod
+    def _post(monkeypatch, update):
+        client = _create_app(monkeypatch).test_client()
+        return client.post(f'/{BOT_TOKEN}', json=update)
+
+    @staticmethod
+    def _update(update_id):
+        return {
+            'update_id': update_id,
+            'message': {'text': '/NadaPraFazer cats', 'from': {'id': 1}},
+        }
+
+    def test_must_acknowledge_and_enqueue(self, mocker, monkeypatch):
+        bot = _patch_state(mocker)
+        submit = mocker.patch.object(
+            bot.work_queue, 'submit', return_value=True)
+
+        response = self._post(monkeypatch, self._update(1))
+
+        assert response.status_code == 200
+        assert submit.call_args == mocker.call(self._update(1))
+
+    def test_must_ignore_repeated_updates(self, mocker, monkeypatch):
+        bot = _patch_state(mocker)
+        submit = mocker.patch.object(
+            bot.work_queue, 'submit', return_value=True)
+
+        self._post(monkeypatch, self._update(1))
+        response = self._post(monkeypatch, self._update(1))
+
+        assert response.status_code == 200
+        assert submit.call_count == 1
+
+    def test_must_refuse_updates_when_busy(self, mocker, monkeypatch):
+        bot = _patch_state(mocker)
+        submit = mocker.patch.object(
+            bot.work_queue, 'submit', return_value=False)
+
+        assert self._post(monkeypatch, self._update(1)).status_code == 503
+
+        submit.return_value = True
+        assert self._post(monkeypatch, self._update(1)).status_code == 200
+        assert submit.call_count == 2
+
+
+class TestMetrics:
+    def test_must_expose_metrics(self, mocker, monkeypatch):
+        _patch_state(mocker, warmer=mocker.Mock())
+        mocker.patch('reddit.utils.iter_reddits', side_effect=_iter_reddits)
+        telegram._get_reddits('cats')
+        telegram._get_reddits('cats')
+
+        response = _create_app(monkeypatch).test_client().get('/metrics')
+        text = response.get_data(as_text=True)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        assert '# TYPE bot_crawl_seconds histogram' in text
+        assert 'bot_crawls_in_flight 0' in text
+        assert 'reddit_page_parse_seconds_count' in text
+        assert 'reddit_http_cache_hits_total' in text
+
+
+class TestStartup:
+    def test_must_import_crawler_without_bot_and_slow_modules(self):
+        modules = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, reddit.utils; print(" ".join(sys.modules))',
+        ]).decode().split()
+
+        for module in ('reddit.telegram', 'flask', 'aiohttp', 'bs4'):
+            assert module not in modules
+
+    def test_must_import_bot_without_building_its_state(self):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import reddit.telegram as telegram; '
+            'print(telegram._get_state.cache_info().currsize)',
+        ]).decode()
+
+        assert output.strip() == '0'
+
+    def test_must_build_bot_state_once(self, mocker, monkeypatch):
+        mocker.patch.object(telegram, 'BotState')
+        telegram._get_state.cache_clear()
+
+        try:
+            _create_app(monkeypatch)
+            _create_app(monkeypatch)
+            assert telegram.BotState.call_count == 1
+        finally:
+            telegram._get_state.cache_clear()
+
+    def test_must_create_app_without_requests(self, mocker, monkeypatch):
+        monkeypatch.setenv('BOT_TOKEN', BOT_TOKEN)
+        get = mocker.patch('requests.get')
+
+        app = reddit.create_app()
+
+        assert get.called is False
+        assert f'/{BOT_TOKEN}' in \
+            [rule.rule for rule in app.url_map.iter_rules()]
+
+    def test_must_register_webhook(self, mocker, monkeypatch):
+        monkeypatch.setenv('BOT_TOKEN', BOT_TOKEN)
+        monkeypatch.setenv('NGROK_URL', 'https://bot.example')
+        get = mocker.patch('requests.get')
+
+        telegram.register_webhook()
+
+        assert get.call_args_list[0] == mocker.call(
+            f'https://api.telegram.org/bot{BOT_TOKEN}/setWebhook',
+            data={'url': f'https://bot.example/{BOT_TOKEN}'},
+            timeout=telegram.TELEGRAM_TIMEOUT,
+        )
@@ -1,8 +1,54 @@
+import asyncio
+import json
+import pickle
+
 import pytest
 import requests
 from bs4 import BeautifulSoup
 
-from reddit import utils
+from reddit import state, utils
+
+LISTING_PAGE = (
+    b'<html><body><div class="side"><p>sidebar</p></div>'
+    b'<div id="siteTable">'
+    b'<div class=" thing id-t3_a1 odd link " data-fullname="t3_a1" '
+    b'data-url="/r/cats/comments/a1/cat/" data-score="6000" '
+    b'data-permalink="/r/cats/comments/a1/cat/" data-subreddit="cats">'
+    b'<p class="title"><a class="title may-blank " href="#">Cat</a></p>'
+    b'</div>'
+    b'<div class=" thing id-t3_b2 even link " data-fullname="t3_b2" '
+    b'data-url="https://i.imgur.com/b2.jpg" data-score="42" '
+    b'data-permalink="/r/cats/comments/b2/kitten/" data-subreddit="cats">'
+    b'<p class="title"><a class="title may-blank " href="#">Kitten</a></p>'
+    b'</div>'
+    b'<div class="nav-buttons"><span class="nextprev">view more: '
+    b'<span class="next-button"><a href="https://old.reddit.com/r/cats/'
+    b'?count=25&amp;after=t3_b2">next</a></span></span></div>'
+    b'</div></body></html>'
+)
+
+LISTING_JSON = json.dumps({'kind': 'Listing', 'data': {
+    'after': 't3_b2',
+    'children': [
+        {'kind': 't3', 'data': {
+            'name': 't3_a1', 'title': 'Cat', 'score': 6000,
+            'url': 'https://www.reddit.com/r/cats/comments/a1/cat/',
+            'is_self': True,
+            'permalink': '/r/cats/comments/a1/cat/', 'subreddit': 'cats',
+        }},
+        {'kind': 't3', 'data': {
+            'name': 't3_b2', 'title': 'Kitten', 'score': 42,
+            'url': 'https://i.imgur.com/b2.jpg',
+            'permalink': '/r/cats/comments/b2/kitten/', 'subreddit': 'cats',
+        }},
+    ],
+}}).encode()
+
+
+def _thread(thread_id, upvotes, subreddit='cats'):
+    return utils.Thread(thread_id, f'https://i.imgur.com/{thread_id}.jpg',
+                        upvotes, f'/r/{subreddit}/comments/{thread_id}/t/',
+                        subreddit)
 
 
 class TestCommandSurroundedByFrame:
@@ -73,34 +119,130 @@ class TestRequestReddit:
 
     def test_must_request_reddit(self, mocker):
         subreddit_name = 'cats'
-        fake_response = requests.Response()
         url = self._get_url(subreddit_name)
+        fake_response = utils.fetch.Response(url, 200, {}, b'')
 
-        mocked_request_get = \
-            mocker.patch('requests.get', return_value=fake_response)
+        fetcher = mocker.Mock()
+        fetcher.get = mocker.AsyncMock(return_value=fake_response)
 
         _request_reddit = self._get_request_subreddit_function()
-        _request_reddit(subreddit_name)
+        response = asyncio.run(_request_reddit(fetcher, subreddit_name))
 
-        assert mocked_request_get.called is True
-        assert mocker.call(url, headers=utils.HEADERS) in \
-            mocked_request_get.call_args_list
+        assert response is fake_response
+        assert fetcher.get.called is True
+        assert mocker.call(url) in fetcher.get.call_args_list
 
     def test_must_raise_error(self, mocker):
         subreddit_name = 'cats'
 
-        mocked_request_get = \
-            mocker.patch('requests.get', side_effect=requests.Timeout)
+        fetcher = mocker.Mock()
+        fetcher.get = mocker.AsyncMock(side_effect=asyncio.TimeoutError)
 
         _request_reddit = self._get_request_subreddit_function()
 
         with pytest.raises(Exception) as ex:
-            _request_reddit(subreddit_name)
+            asyncio.run(_request_reddit(fetcher, subreddit_name))
 
-        assert mocked_request_get.called is True
+        assert fetcher.get.called is True
         assert ex.value.args[0] == f'Can not request "https://old.reddit' \
                                    f'.com/r/{subreddit_name}/".'
 
+    @pytest.mark.parametrize('status', (404, 429, 503))
+    def test_must_raise_error_on_error_status(self, mocker, status):
+        url = self._get_url('cats')
+        fetcher = mocker.Mock()
+        fetcher.get = mocker.AsyncMock(
+            return_value=utils.fetch.Response(url, status, {}, b''))
+
+        _request_reddit = self._get_request_subreddit_function()
+
+        with pytest.raises(Exception) as ex:
+            asyncio.run(_request_reddit(fetcher, 'cats'))
+
+        assert ex.value.args[0] == f'Can not request "{url}".'
+
+    def test_must_request_top_listing(self, mocker):
+        fetcher = mocker.Mock()
+        fetcher.get = mocker.AsyncMock(
+            return_value=utils.fetch.Response('', 200, {}, b''))
+
+        _request_reddit = self._get_request_subreddit_function()
+        asyncio.run(_request_reddit(fetcher, 'cats', 'week'))
+
+        assert fetcher.get.call_args == mocker.call(
+            'https://old.reddit.com/r/cats/top/?t=week')
+
+    @pytest.mark.parametrize('top, expected_url', (
+        (None, 'https://old.reddit.com/r/cats/.json?raw_json=1'),
+        ('day', 'https://old.reddit.com/r/cats/top/.json?t=day&raw_json=1'),
+    ))
+    def test_must_request_json_listing(self, mocker, top, expected_url):
+        fetcher = mocker.Mock()
+        fetcher.get = mocker.AsyncMock(
+            return_value=utils.fetch.Response('', 200, {}, b''))
+
+        _request_reddit = self._get_request_subreddit_function()
+        asyncio.run(_request_reddit(fetcher, 'cats', top, 'json'))
+
+        assert fetcher.get.call_args == mocker.call(expected_url)
+
+
+class TestThread:
+    @staticmethod
+    def _thread(url='/r/cats/comments/a1/cat/'):
+        return utils.Thread('Cat', url, 6000, '/r/cats/comments/a1/cat/',
+                            'cats')
+
+    def test_must_serialize_to_output_format(self):
+        assert self._thread().as_dict() == {
+            'title': 'Cat',
+            'link': 'https://old.reddit.com/r/cats/comments/a1/cat/',
+            'upvotes': 6000,
+            'comments_link':
+                'https://old.reddit.com/r/cats/comments/a1/cat/',
+            'subreddit_link': 'https://old.reddit.com/r/cats',
+        }
+        assert json.loads(json.dumps(
+            [self._thread()], default=utils.Thread.as_dict)) == \
+            [self._thread().as_dict()]
+
+    def test_must_keep_absolute_links(self):
+        assert self._thread('https://i.imgur.com/a.jpg')['link'] == \
+            'https://i.imgur.com/a.jpg'
+
+    def test_must_support_dict_style_reads(self):
+        thread = self._thread()
+
+        assert thread['upvotes'] == thread.get('upvotes') == 6000
+        assert 'comments_link' in thread
+        assert thread.get('missing', 0) == 0
+        with pytest.raises(KeyError):
+            thread['url']
+        with pytest.raises(TypeError):
+            thread['upvotes'] = 7000
+
+    def test_must_return_fullname_and_subreddit_name(self):
+        thread = utils.Thread('Cat', '', 1, '/r/Cats/comments/a1b2/cat/',
+                              'Cats')
+
+        assert thread.thread_id == 't3_a1b2'
+        assert thread.subreddit_name == 'cats'
+
+    def test_must_intern_subreddit_names(self):
+        name = ''.join(['ca', 'ts'])
+
+        assert utils.Thread('', '', 0, '', name).subreddit is \
+            self._thread().subreddit
+
+    def test_must_pickle_compactly(self):
+        thread = pickle.loads(pickle.dumps(self._thread()))
+
+        assert thread == self._thread()
+        assert thread.subreddit is self._thread().subreddit
+
+    def test_must_not_have_instance_dict(self):
+        assert not hasattr(self._thread(), '__dict__')
+
 
 class TestParseResponse:
     @staticmethod
@@ -130,8 +272,8 @@ class TestParseResponse:
 
         fake_items = 'fake_items'
 
-        __new__ = mocker.patch.object(
-            BeautifulSoup, '__new__',
+        _make_soup = mocker.patch(
+            'reddit.utils._make_soup',
             return_value=BeautifulSoup('', 'html.parser'))
 
         _parse_reddit_items = mocker.patch(
@@ -140,39 +282,139 @@ class TestParseResponse:
         )
 
         _parse_response = self._get_parse_response_function()
-        assert _parse_response(fake_response) == fake_items
+        items, _ = _parse_response(fake_response)
+        assert items == fake_items
 
-        assert __new__.called is True
+        assert _make_soup.called is True
         assert _parse_reddit_items.called is True
 
+    def test_must_build_a_single_document(self, mocker):
+        fake_response = requests.Response()
+        setattr(fake_response, '_content', LISTING_PAGE)
 
-class TestRequestConcurrent:
-    @staticmethod
-    def _get_request_concurrent_function():
-        return getattr(utils, '_request_concurrent')
+        _make_soup = mocker.spy(utils, '_make_soup')
 
-    def test_must_set_a_new_loop(self, mocker):
-        mocked_new_event_loop = mocker.patch('asyncio.new_event_loop')
-        mocked_set_event_loop = mocker.patch('asyncio.set_event_loop')
+        _parse_response = self._get_parse_response_function()
+        _parse_response(fake_response)
 
-        _request_concurrent = self._get_request_concurrent_function()
-        _request_concurrent('car')
+        assert _make_soup.call_count == 1
 
-        assert mocked_new_event_loop.called is True
-        assert mocked_set_event_loop.called is True
+    @pytest.mark.parametrize('parser', sorted(utils.PARSERS))
+    def test_must_return_items_and_next_page_url(self, parser):
+        fake_response = requests.Response()
+        setattr(fake_response, '_content', LISTING_PAGE)
 
+        _parse_response = self._get_parse_response_function()
+        items, next_page_url = _parse_response(fake_response, parser)
+
+        assert [item['upvotes'] for item in items] == [6000, 42]
+        assert items[0].as_dict() == {
+            'title': 'Cat',
+            'link': 'https://old.reddit.com/r/cats/comments/a1/cat/',
+            'upvotes': 6000,
+            'comments_link':
+                'https://old.reddit.com/r/cats/comments/a1/cat/',
+            'subreddit_link': 'https://old.reddit.com/r/cats',
+        }
+        assert next_page_url == \
+            'https://old.reddit.com/r/cats/?count=25&after=t3_b2'
+
+    def test_must_decode_json_listing_into_same_items(self):
+        html_response = requests.Response()
+        setattr(html_response, '_content', LISTING_PAGE)
+        json_response = utils.fetch.Response(
+            'https://old.reddit.com/r/cats/.json?raw_json=1', 200, {},
+            LISTING_JSON)
 
-class TestUnpack:
-    @staticmethod
-    def _get_unpack_function():
-        return getattr(utils, '_unpack')
+        _parse_response = self._get_parse_response_function()
+        items, next_page_url = _parse_response(
+            json_response, backend='json')
 
-    def test_must_return_upacked_valeu(self):
-        value = [[1, 2], [3, 4]]
-        expected = [1, 2, 3, 4]
-        _unpack = self._get_unpack_function()
+        assert items == _parse_response(html_response)[0]
+        assert next_page_url == \
+            'https://old.reddit.com/r/cats/.json?raw_json=1&after=t3_b2'
+
+    def test_must_stop_json_listing_without_after(self):
+        json_response = utils.fetch.Response(
+            'https://old.reddit.com/r/cats/.json', 200, {},
+            b'{"data": {"after": null, "children": []}}')
+
+        _parse_response = self._get_parse_response_function()
 
-        assert _unpack(value) == expected
+        assert _parse_response(json_response, backend='json') == ([], None)
+
+    def test_must_return_none_without_next_button(self):
+        fake_response = requests.Response()
+        setattr(fake_response, '_content', b'<html></html>')
+
+        _parse_response = self._get_parse_response_function()
+
+        assert _parse_response(fake_response) == ([], None)
+
+
+class TestParsePage:
+    def test_must_parse_in_process_without_executor(self):
+        response = utils.fetch.Response(
+            'https://old.reddit.com/r/cats/', 200, {}, LISTING_PAGE)
+
+        assert asyncio.run(utils._parse_page(response)) == \
+            utils._parse_response(response)
+
+    def test_must_parse_in_executor_processes(self):
+        response = utils.fetch.Response(
+            'https://old.reddit.com/r/cats/', 200, {}, LISTING_PAGE)
+
+        with utils._parse_executor(2, utils.PARSE_POOL_MIN_PAGES) \
+                as executor:
+            page = asyncio.run(utils._parse_page(
+                response, 'lxml', executor=executor))
+
+        assert page == utils._parse_response(response)
+
+    @pytest.mark.parametrize('workers, pages', (
+        (1, 100),
+        (4, utils.PARSE_POOL_MIN_PAGES - 1),
+    ))
+    def test_must_not_open_pool_for_small_runs(self, workers, pages):
+        with utils._parse_executor(workers, pages) as executor:
+            assert executor is None
+
+
+class TestListingExtractor:
+    @pytest.mark.parametrize('chunk_size', (1, 7, 64, len(LISTING_PAGE)))
+    def test_must_extract_same_page_in_chunks(self, chunk_size):
+        extractor = utils.ListingExtractor()
+        items = []
+        for index in range(0, len(LISTING_PAGE), chunk_size):
+            items += extractor.feed_bytes(
+                LISTING_PAGE[index:index + chunk_size])
+        items += extractor.close()
+
+        assert (items, extractor.next_page_url) == \
+            utils._parse_response(utils.fetch.Response(
+                'https://old.reddit.com/r/cats/', 200, {}, LISTING_PAGE))
+
+    def test_must_emit_threads_as_soon_as_they_close(self):
+        extractor = utils.ListingExtractor()
+        title_end = LISTING_PAGE.index(b'Cat')
+        first_thread_end = \
+            LISTING_PAGE.index(b'</div>', title_end) + len(b'</div>')
+
+        items = extractor.feed_bytes(LISTING_PAGE[:first_thread_end])
+
+        assert [item['title'] for item in items] == ['Cat']
+        assert extractor.next_page_url is None
+
+    def test_must_decode_characters_split_across_chunks(self):
+        page = '<div class="thing" data-score="1" data-subreddit="cats">' \
+               '<a class="title">Gatô</a></div>'.encode()
+        split = page.index('ô'.encode()) + 1
+        extractor = utils.ListingExtractor()
+
+        items = extractor.feed_bytes(page[:split]) + \
+            extractor.feed_bytes(page[split:]) + extractor.close()
+
+        assert items[0]['title'] == 'Gatô'
 
 
 class TestFilterByUpvotes:
@@ -182,11 +424,11 @@ class TestFilterByUpvotes:
 
     def test_must_return_upacked_valeu(self):
         value = [
-            {'upvotes': 1},
-            {'upvotes': 5},
-            {'upvotes': 9},
-            {'upvotes': 10},
-            {'upvotes': 20},
+            _thread('a', 1),
+            _thread('b', 5),
+            _thread('c', 9),
+            _thread('d', 10),
+            _thread('e', 20),
         ]
         expected_length = 2
         _filter_by_upvotes = self._get_filter_by_upvotes_function()
@@ -194,99 +436,425 @@ class TestFilterByUpvotes:
         assert len(_filter_by_upvotes(value, 10)) == expected_length
 
 
-class TestGetReddits:
-    fake_response = requests.Response()
-    subreddit_names = 'cats;bear'
-    subreddits = 'car', 'bear'
-    expected_value = 'expected_fake_value'
+async def _collect(async_iterator):
+    return [item async for item in async_iterator]
 
-    def _mock_split_subreddit_names(self, mocker):
-        return mocker.patch('reddit.utils._split_subreddit_names',
-                            return_value=self.subreddits)
 
-    def _mock_request_concurrent(self, mocker):
-        return mocker.patch('reddit.utils._request_concurrent',
-                            return_value=[self.fake_response])
+async def _async_iter(values):
+    for value in values:
+        yield value
 
-    def _mock_request_concurrent_next_pages(self, mocker):
-        return mocker.patch('reddit.utils._request_concurrent_next_pages',
-                            return_value=[self.fake_response])
 
-    def _mock_parse_response(self, mocker):
-        return mocker.patch('reddit.utils._parse_response',
-                            return_value=self.expected_value)
+class TestPlanBatches:
+    @pytest.mark.parametrize('batch_size, expected_batches', (
+        (1, [('a',), ('b',), ('c',)]),
+        (2, [('a', 'b'), ('c',)]),
+        (5, [('a', 'b', 'c')]),
+    ))
+    def test_must_group_subreddits(self, batch_size, expected_batches):
+        assert utils._plan_batches(('a', 'b', 'c'), batch_size) == \
+            expected_batches
 
-    def _mock_unpack(self, mocker):
-        return mocker.patch('reddit.utils._unpack',
-                            return_value=self.expected_value)
 
-    def _mock_filter_by_upvotes(self, mocker):
-        return mocker.patch('reddit.utils._filter_by_upvotes',
-                            return_value=self.expected_value)
+class TestCrawlSubreddit:
+    @staticmethod
+    def _get_crawl_subreddit_function():
+        return getattr(utils, '_crawl_subreddit')
 
-    def test_must_return_expected_value(self, mocker):
-        self._mock_parse_response(mocker)
-        self._mock_request_concurrent(mocker)
-        self._mock_request_concurrent_next_pages(mocker)
-        self._mock_split_subreddit_names(mocker)
-        self._mock_unpack(mocker)
-        self._mock_filter_by_upvotes(mocker)
+    @staticmethod
+    def _page(index, next_page_url):
+        return [f'item{index}'], next_page_url
+
+    def test_must_follow_next_pages_until_depth(self, mocker):
+        fetcher = mocker.Mock()
+        mocker.patch('reddit.utils._request_subreddit')
+        _request_url = mocker.patch('reddit.utils._request_url')
+        mocker.patch('reddit.utils._parse_response', side_effect=[
+            self._page(index, f'next{index}') for index in range(5)
+        ])
+
+        _crawl_subreddit = self._get_crawl_subreddit_function()
+        pages = asyncio.run(
+            _collect(_crawl_subreddit(fetcher, 'cats', depth=3)))
+
+        assert pages == [self._page(index, f'next{index}')
+                         for index in range(3)]
+        assert _request_url.call_args_list == [
+            mocker.call(fetcher, 'next0'),
+            mocker.call(fetcher, 'next1'),
+        ]
 
-        assert utils.get_reddits(self.subreddit_names) == \
-            self.expected_value
+    def test_must_stop_without_next_page(self, mocker):
+        mocker.patch('reddit.utils._request_subreddit')
+        _request_url = mocker.patch('reddit.utils._request_url')
+        mocker.patch('reddit.utils._parse_response',
+                     return_value=self._page(0, None))
+
+        _crawl_subreddit = self._get_crawl_subreddit_function()
+        pages = asyncio.run(
+            _collect(_crawl_subreddit(mocker.Mock(), 'cats')))
+
+        assert pages == [self._page(0, None)]
+        assert _request_url.called is False
+
+    def test_must_raise_after_pages_crawled_before_an_error(self, mocker):
+        mocker.patch('reddit.utils._request_subreddit')
+        mocker.patch('reddit.utils._request_url', side_effect=Exception)
+        mocker.patch('reddit.utils._parse_response',
+                     return_value=self._page(0, 'next0'))
+        pages = []
+
+        async def collect():
+            _crawl_subreddit = self._get_crawl_subreddit_function()
+            async for page in _crawl_subreddit(mocker.Mock(), 'cats'):
+                pages.append(page)
+
+        with pytest.raises(Exception):
+            asyncio.run(collect())
+        assert pages == [self._page(0, 'next0')]
+
+    @pytest.mark.parametrize('top, expected_pages', (
+        (None, 3),
+        ('day', 2),
+    ))
+    def test_must_stop_top_listing_below_min_upvotes(
+            self, mocker, top, expected_pages):
+        mocker.patch('reddit.utils._request_subreddit')
+        mocker.patch('reddit.utils._request_url')
+        mocker.patch('reddit.utils._parse_response', side_effect=[
+            ([_thread('a', 9000), _thread('b', 6000)], 'next0'),
+            ([_thread('c', 5500), _thread('d', 4000)], 'next1'),
+            ([_thread('e', 3000)], 'next2'),
+        ])
+
+        _crawl_subreddit = self._get_crawl_subreddit_function()
+        pages = asyncio.run(_collect(_crawl_subreddit(
+            mocker.Mock(), 'cats', 3, top=top, min_upvotes=5000)))
+
+        assert len(pages) == expected_pages
+
+    def test_must_stop_incremental_crawl_on_known_pages(self, mocker):
+        crawl_state = state.CrawlState(':memory:')
+        crawl_state.update([_thread('a', 6000), _thread('b', 10)])
+        mocker.patch('reddit.utils._request_subreddit')
+        mocker.patch('reddit.utils._request_url')
+        mocker.patch('reddit.utils._parse_response', side_effect=[
+            ([_thread('c', 10), _thread('a', 6000)], 'next0'),
+            ([_thread('b', 10)], 'next1'),
+            ([_thread('d', 10)], 'next2'),
+        ])
+
+        _crawl_subreddit = self._get_crawl_subreddit_function()
+        pages = asyncio.run(_collect(_crawl_subreddit(
+            mocker.Mock(), 'cats', 3, min_upvotes=5000,
+            crawl_state=crawl_state)))
+
+        assert len(pages) == 2
+
+
+class TestStreamSubreddit:
+    class FakeFetcher:
+        def __init__(self, pages):
+            self.pages = pages
+            self.events = []
+
+        async def stream(self, url):
+            self.events.append(('start', url))
+            for chunk in self.pages[url]:
+                await asyncio.sleep(0.01)
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+            self.events.append(('end', url))
 
-    def test_must_split_subreddit_names(self, mocker):
-        self._mock_parse_response(mocker)
-        self._mock_request_concurrent(mocker)
-        self._mock_request_concurrent_next_pages(mocker)
-        self._mock_filter_by_upvotes(mocker)
+    @staticmethod
+    def _pages():
+        next_button_end = LISTING_PAGE.index(b'</span>') + len(b'</span>')
+        first_url = utils._get_subreddit_url('cats')
+        next_url = 'https://old.reddit.com/r/cats/?count=25&after=t3_b2'
+        page = [LISTING_PAGE[:next_button_end],
+                LISTING_PAGE[next_button_end:]]
+        return {first_url: page, next_url: page}, first_url, next_url
+
+    def test_must_request_next_page_before_current_one_ends(self):
+        pages, first_url, next_url = self._pages()
+        fetcher = self.FakeFetcher(pages)
+
+        crawled = asyncio.run(_collect(utils._crawl_subreddit(
+            fetcher, 'cats', 2, utils.STREAM_PARSER)))
+
+        assert fetcher.events.index(('start', next_url)) < \
+            fetcher.events.index(('end', first_url))
+        assert [item['title'] for items, _ in crawled for item in items] \
+            == ['Cat', 'Kitten'] * 2
+        assert [next_page_url for _, next_page_url in crawled
+                if next_page_url] == [next_url] * 2
+
+    def test_must_not_prefetch_top_listings(self):
+        pages, first_url, next_url = self._pages()
+        pages[utils._get_subreddit_url('cats', 'day')] = pages[first_url]
+        fetcher = self.FakeFetcher(pages)
+
+        asyncio.run(_collect(utils._crawl_subreddit(
+            fetcher, 'cats', 2, utils.STREAM_PARSER, 'day',
+            min_upvotes=5000)))
+
+        assert ('start', next_url) not in fetcher.events
+
+    def test_must_raise_after_threads_streamed_before_an_error(self):
+        first_url = utils._get_subreddit_url('cats')
+        first_thread_end = LISTING_PAGE.index(b'Kitten')
+        fetcher = self.FakeFetcher({first_url: [
+            LISTING_PAGE[:first_thread_end], Exception('Reset.')]})
+        crawled = []
+
+        async def collect():
+            async for page in utils._crawl_subreddit(
+                    fetcher, 'cats', 2, utils.STREAM_PARSER):
+                crawled.append(page)
+
+        with pytest.raises(Exception):
+            asyncio.run(collect())
+        assert [item['title'] for items, _ in crawled for item in items] \
+            == ['Cat']
+
+
+class TestIterPages:
+    @staticmethod
+    def _get_iter_pages_function():
+        return getattr(utils, '_iter_pages')
+
+    def test_must_not_wait_for_slow_subreddits(self, mocker):
+        async def crawl(fetcher, subreddit_name, depth, parser, *args):
+            delay = 0.2 if subreddit_name == 'slow' else 0
+            for page_number in range(depth):
+                await asyncio.sleep(delay)
+                yield [f'{subreddit_name}{page_number}'], None
+
+        mocker.patch('reddit.utils._crawl_subreddit', new=crawl)
+
+        _iter_pages = self._get_iter_pages_function()
+        pages = asyncio.run(_collect(
+            _iter_pages(mocker.Mock(), ('slow', 'fast'), 3, 'lxml')))
+
+        assert [items[0] for items, _ in pages] == \
+            ['fast0', 'fast1', 'fast2', 'slow0', 'slow1', 'slow2']
+
+    def test_must_report_subreddits_after_their_pages(self, mocker):
+        async def crawl(fetcher, subreddit_name, depth, parser, *args):
+            delay = 0.2 if subreddit_name == 'slow' else 0
+            for page_number in range(depth):
+                await asyncio.sleep(delay)
+                yield [f'{subreddit_name}{page_number}'], None
+
+        mocker.patch('reddit.utils._crawl_subreddit', new=crawl)
+        events = []
+
+        async def consume():
+            async for items, _ in self._get_iter_pages_function()(
+                    mocker.Mock(), ('slow', 'fast'), 2, 'lxml',
+                    on_done=lambda names, failed: events.append(names)):
+                events.append(items[0])
+
+        asyncio.run(consume())
+
+        assert events == \
+            ['fast0', 'fast1', ('fast',), 'slow0', 'slow1', ('slow',)]
+
+    def test_must_report_failed_subreddits(self, mocker):
+        async def crawl(fetcher, subreddit_name, *args):
+            if subreddit_name == 'tiny':
+                raise Exception
+            yield [
+                _thread('a', 10, name) for name in subreddit_name.split('+')
+                if name not in ('tiny', 'dogs')
+            ], None
+            if subreddit_name == 'dogs':
+                raise Exception
+
+        mocker.patch('reddit.utils._crawl_subreddit', new=crawl)
+        done = []
+
+        asyncio.run(_collect(self._get_iter_pages_function()(
+            mocker.Mock(), ('cats', 'tiny', 'dogs'), batch_size=2,
+            on_done=lambda names, failed: done.append((names, failed)))))
+
+        assert sorted(done) == [
+            (('cats', 'tiny'), {'tiny'}),
+            (('dogs',), {'dogs'}),
+        ]
 
-        _split_subreddit_names = self._mock_split_subreddit_names(mocker)
+    def test_must_cancel_crawls_when_closed(self, mocker):
+        cancelled = []
 
-        utils.get_reddits(self.subreddit_names)
+        async def crawl(fetcher, subreddit_name, depth, parser, *args):
+            try:
+                yield [subreddit_name], None
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(subreddit_name)
+                raise
 
-        assert _split_subreddit_names.called is True
+        mocker.patch('reddit.utils._crawl_subreddit', new=crawl)
 
-        assert mocker.call(self.subreddit_names) in \
-            _split_subreddit_names.call_args_list
+        async def first_page():
+            pages = self._get_iter_pages_function()(
+                mocker.Mock(), ('cats', 'dogs'))
+            page = await pages.__anext__()
+            await pages.aclose()
+            return page
 
-    def test_must_request_concurrently(self, mocker):
-        self._mock_parse_response(mocker)
-        self._mock_split_subreddit_names(mocker)
-        self._mock_request_concurrent_next_pages(mocker)
-        self._mock_filter_by_upvotes(mocker)
+        assert asyncio.run(first_page()) in ((['cats'], None),
+                                             (['dogs'], None))
+        assert sorted(cancelled) == ['cats', 'dogs']
 
-        _request_concurrent = self._mock_request_concurrent(mocker)
+    def test_must_crawl_combined_listings(self, mocker):
+        listings = []
 
-        utils.get_reddits(self.subreddit_names)
+        async def crawl(fetcher, subreddit_name, *args):
+            listings.append(subreddit_name)
+            yield [
+                _thread('a', 10, name)
+                for name in subreddit_name.split('+') if name != 'tiny'
+            ], None
 
-        assert _request_concurrent.called is True
-        assert mocker.call(self.subreddits) in \
-            _request_concurrent.call_args_list
+        mocker.patch('reddit.utils._crawl_subreddit', new=crawl)
 
-    def test_must_request__next_page_concurrently(self, mocker):
-        self._mock_parse_response(mocker)
-        self._mock_split_subreddit_names(mocker)
-        self._mock_request_concurrent(mocker)
-        self._mock_filter_by_upvotes(mocker)
+        _iter_pages = self._get_iter_pages_function()
+        pages = asyncio.run(_collect(_iter_pages(
+            mocker.Mock(), ('cats', 'Dogs', 'tiny', 'cows'), batch_size=3)))
 
-        _request_concurrent_next_page = \
-            self._mock_request_concurrent_next_pages(mocker)
+        assert listings == ['cats+Dogs+tiny', 'cows', 'tiny']
+        assert len(pages) == 3
 
-        utils.get_reddits(self.subreddit_names)
 
-        assert _request_concurrent_next_page.called is True
+class TestIterReddits:
+    subreddit_names = 'cats;bear'
+    subreddits = 'cats', 'bear'
+
+    def _mock_iter_pages(self, mocker, pages):
+        return mocker.patch(
+            'reddit.utils._iter_pages',
+            side_effect=lambda *args: _async_iter(pages))
+
+    def test_must_share_one_fetcher(self, mocker):
+        fetcher = mocker.patch('reddit.fetch.Fetcher')
+        _iter_pages = self._mock_iter_pages(mocker, [])
+
+        list(utils.iter_reddits(self.subreddit_names, depth=3,
+                                concurrency=2))
+
+        assert fetcher.call_args == mocker.call(
+            2, utils.HEADERS, None, utils.fetch.limits.DEFAULT_RATE,
+            connect_timeout=utils.fetch.DEFAULT_CONNECT_TIMEOUT,
+            read_timeout=utils.fetch.DEFAULT_READ_TIMEOUT,
+            retries=utils.fetch.DEFAULT_RETRIES,
+            hedge=False,
+            hedge_after=None,
+        )
+        assert _iter_pages.call_args == mocker.call(
+            fetcher.return_value.__aenter__.return_value,
+            self.subreddits, 3, utils.DEFAULT_PARSER, None, 5000,
+            utils.DEFAULT_BACKEND, utils.DEFAULT_BATCH_SIZE, None, None, None)
+
+    def test_must_yield_filtered_items_of_every_page(self, mocker):
+        mocker.patch('reddit.fetch.Fetcher')
+        self._mock_iter_pages(mocker, [
+            ([_thread('a', 1), _thread('b', 10)], 'next'),
+            ([_thread('c', 20)], None),
+        ])
+
+        threads = utils.iter_reddits(self.subreddit_names, 10)
+
+        assert next(threads) == _thread('b', 10)
+        assert list(threads) == [_thread('c', 20)]
+
+    def test_must_yield_only_new_or_changed_threads(self, mocker):
+        mocker.patch('reddit.fetch.Fetcher')
+        self._mock_iter_pages(mocker, [
+            ([_thread('a', 10), _thread('b', 20), _thread('c', 30)], None),
+        ])
+        crawl_state = state.CrawlState(':memory:')
+        crawl_state.update([_thread('a', 10), _thread('b', 15)])
+
+        threads = utils.get_reddits(
+            self.subreddit_names, 10, crawl_state=crawl_state)
+
+        assert threads == [_thread('b', 20), _thread('c', 30)]
+
+    def test_must_yield_duplicated_threads_once(self, mocker):
+        thread = _thread('a', 10)
+        mocker.patch('reddit.fetch.Fetcher')
+        self._mock_iter_pages(mocker, [
+            ([_thread('a', 10)], 'next'),
+            ([_thread('a', 20)], None),
+        ])
+        crawl_state = state.CrawlState(':memory:')
+
+        threads = utils.get_reddits(
+            self.subreddit_names, 10, crawl_state=crawl_state)
+
+        assert threads == [thread]
+        assert crawl_state.get_scores([thread]) == {'t3_a': 10}
+
+    def test_must_yield_duplicates_of_threads_below_min_upvotes(
+            self, mocker):
+        mocker.patch('reddit.fetch.Fetcher')
+        self._mock_iter_pages(mocker, [
+            ([_thread('a', 5)], 'next'),
+            ([_thread('a', 20)], None),
+        ])
+
+        threads = utils.get_reddits(self.subreddit_names, 10)
+
+        assert threads == [_thread('a', 20)]
 
-    def test_must_parse_response(self, mocker):
-        self._mock_request_concurrent(mocker)
-        self._mock_split_subreddit_names(mocker)
-        self._mock_request_concurrent_next_pages(mocker)
-        self._mock_filter_by_upvotes(mocker)
+    def test_must_close_crawl_when_closed(self, mocker):
+        fetcher = mocker.patch('reddit.fetch.Fetcher')
+        self._mock_iter_pages(mocker, [
+            ([_thread('a', 10), _thread('b', 10)], None),
+        ])
 
-        _parse_response = self._mock_parse_response(mocker)
+        threads = utils.iter_reddits(self.subreddit_names, 10)
+        next(threads)
+        threads.close()
 
-        utils.get_reddits(self.subreddit_names)
+        assert fetcher.return_value.__aexit__.called is True
 
-        assert _parse_response.called is True
-        assert mocker.call(self.fake_response) in \
-            _parse_response.call_args_list
+    def test_must_yield_asynchronously(self, mocker):
+        mocker.patch('reddit.fetch.Fetcher')
+        self._mock_iter_pages(mocker, [([_thread('a', 10)], None)])
+
+        threads = asyncio.run(
+            _collect(utils.aiter_reddits(self.subreddit_names, 10)))
+
+        assert threads == [_thread('a', 10)]
+
+
+class TestGetReddits:
+    def test_must_return_every_thread(self, mocker):
+        iter_reddits = mocker.patch('reddit.utils.iter_reddits',
+                                    return_value=iter(['a', 'b']))
+
+        assert utils.get_reddits('cats', 10, depth=2) == ['a', 'b']
+        assert iter_reddits.call_args == mocker.call('cats', 10, depth=2)
+
+    @pytest.mark.parametrize('parser', ['html.parser', 'stream'])
+    def test_must_stop_incremental_crawl_after_first_known_page(
+            self, monkeypatch, parser):
+        from benchmarks import replay
+
+        crawl_state = state.CrawlState(':memory:')
+        with replay.ReplayServer() as server:
+            monkeypatch.setattr(utils, 'BASE_URL', server.url)
+            first = utils.get_reddits(
+                'cats;dogs', 5000, depth=6, parser=parser, rate=0,
+                crawl_state=crawl_state)
+            first_requests = server.requests
+            second = utils.get_reddits(
+                'cats;dogs', 5000, depth=6, parser=parser, rate=0,
+                crawl_state=crawl_state)
+
+        assert first and first_requests == 12
+        assert second == []
+        assert server.requests - first_requests == 2
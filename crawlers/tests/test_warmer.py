@@ -0,0 +1,81 @@
+import threading
+
+from reddit import warmer
+
+
+class TestCacheWarmer:
+    @staticmethod
+    def _warmer(mocker, **options):
+        refreshed = []
+
+        def refresh(subreddit):
+            refreshed.append(subreddit)
+            return [f'{subreddit} thread']
+
+        cache_warmer = warmer.CacheWarmer(refresh, **options)
+        mocker.patch.object(cache_warmer, '_start')
+        return cache_warmer, refreshed
+
+    def test_must_refresh_most_requested_subreddits(self, mocker):
+        cache_warmer, refreshed = self._warmer(mocker, top=2)
+        cache_warmer.record(('cats', 'dogs'))
+        cache_warmer.record(('dogs', 'birds'))
+        cache_warmer.record(('birds',))
+        cache_warmer.record(('dogs',))
+
+        assert cache_warmer.run_once() == ['dogs', 'birds']
+        assert refreshed == ['dogs', 'birds']
+
+    def test_must_respect_request_budget(self, mocker):
+        cache_warmer, refreshed = self._warmer(
+            mocker, top=10, budget=12, cost=6)
+        cache_warmer.record(('a', 'b', 'c', 'd'))
+
+        cache_warmer.run_once()
+
+        assert len(refreshed) == 2
+
+    def test_must_forget_subreddits_no_longer_requested(self, mocker):
+        cache_warmer, refreshed = self._warmer(mocker)
+        cache_warmer.record(('cats',))
+
+        for _ in range(3):
+            cache_warmer.run_once()
+
+        assert refreshed == ['cats', 'cats']
+        assert cache_warmer.get_status() == []
+
+    def test_must_keep_warming_after_errors(self, mocker):
+        def refresh(subreddit):
+            if subreddit == 'cats':
+                raise Exception('error')
+            return []
+
+        cache_warmer = warmer.CacheWarmer(refresh)
+        mocker.patch.object(cache_warmer, '_start')
+        cache_warmer.record(('cats', 'dogs'))
+
+        assert cache_warmer.run_once() == ['dogs']
+        assert [entry['subreddit'] for entry in cache_warmer.get_status()] \
+            == ['dogs']
+
+    def test_must_not_record_when_disabled(self, mocker):
+        cache_warmer, _ = self._warmer(mocker, top=0)
+        cache_warmer.record(('cats',))
+
+        assert cache_warmer.get_popular() == []
+        assert cache_warmer._start.called is False
+
+    def test_must_refresh_in_background(self):
+        refreshed = threading.Event()
+
+        def refresh(subreddit):
+            refreshed.set()
+            return []
+
+        cache_warmer = warmer.CacheWarmer(refresh, interval=0.01)
+        cache_warmer.record(('cats',))
+        try:
+            assert refreshed.wait(5) is True
+        finally:
+            cache_warmer.stop()
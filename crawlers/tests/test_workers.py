@@ -0,0 +1,94 @@
+import threading
+
+from reddit import workers
+
+
+class TestWorkQueue:
+    def test_must_handle_submitted_items(self):
+        handled = []
+        work_queue = workers.WorkQueue(handled.append, workers=2)
+
+        for item in range(5):
+            assert work_queue.submit(item) is True
+        work_queue.join()
+
+        assert sorted(handled) == [0, 1, 2, 3, 4]
+
+    def test_must_refuse_items_when_full(self):
+        release = threading.Event()
+        work_queue = workers.WorkQueue(
+            lambda item: release.wait(), workers=1, max_size=1)
+
+        accepted = [work_queue.submit(item) for item in range(4)]
+        release.set()
+        work_queue.join()
+
+        assert accepted.count(False) >= 2
+
+    def test_must_keep_working_after_errors(self):
+        handled = []
+
+        def handler(item):
+            if item == 'error':
+                raise Exception('error')
+            handled.append(item)
+
+        work_queue = workers.WorkQueue(handler, workers=1)
+        work_queue.submit('error')
+        work_queue.submit('ok')
+        work_queue.join()
+
+        assert handled == ['ok']
+
+
+class TestRecentKeys:
+    def test_must_detect_repeated_keys(self):
+        keys = workers.RecentKeys()
+
+        assert keys.add(1) is True
+        assert keys.add(1) is False
+
+    def test_must_forget_old_keys(self):
+        keys = workers.RecentKeys(max_keys=2)
+        for key in range(3):
+            keys.add(key)
+
+        assert keys.add(0) is True
+        assert keys.add(2) is False
+
+    def test_must_discard_keys(self):
+        keys = workers.RecentKeys()
+        keys.add(1)
+        keys.discard(1)
+
+        assert keys.add(1) is True
+
+
+class TestKeyRateLimiter:
+    def test_must_space_calls_of_the_same_key(self, mocker):
+        sleep = mocker.patch('time.sleep')
+        mocker.patch('time.monotonic', return_value=100.0)
+        limiter = workers.KeyRateLimiter(rate=2)
+
+        delays = [limiter.wait(1) for _ in range(3)]
+
+        assert delays == [0.0, 0.5, 1.0]
+        assert sleep.call_args_list == [mocker.call(0.5), mocker.call(1.0)]
+
+    def test_must_not_wait_for_other_keys(self, mocker):
+        mocker.patch('time.sleep')
+        limiter = workers.KeyRateLimiter(rate=1)
+
+        limiter.wait(1)
+
+        assert limiter.wait(2) == 0.0
+
+    def test_must_hold_delayed_keys(self, mocker):
+        mocker.patch('time.sleep')
+        mocker.patch('time.monotonic', return_value=100.0)
+        limiter = workers.KeyRateLimiter(rate=0)
+
+        limiter.delay(1, 3)
+
+        assert limiter.wait(1) == 3
+        assert limiter.wait(1) == 3
@@ -0,0 +1,104 @@
+"""Compare the justify engine against the previous recursive algorithm.
+
+Lines of input1.txt, alone and repeated 100 times, are justified at
+several widths. Both implementations must return the same lines.
+
+Usage: python -m benchmarks.justify [--repeat 5]
+"""
+import argparse
+import itertools
+import os
+import sys
+import timeit
+
+from textwrapper import utils
+
+INPUT_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'input1.txt'
+)
+WIDTHS = (40, 80, 200, 1000, 10000)
+
+
+def _legacy_fill_with_spaces(words, remaining_spaces):
+    if not remaining_spaces:
+        return words
+
+    for index in range(1, len(words)):
+        words[index] = words[index].rjust(len(words[index]) + 1)
+        remaining_spaces -= 1
+
+        if not remaining_spaces:
+            break
+
+    return _legacy_fill_with_spaces(words, remaining_spaces)
+
+
+def legacy_justify(text, max_length):
+    """Justify implementation replaced by utils.justify."""
+    text_length = len(text)
+
+    if text_length == max_length:
+        return text
+
+    words = text.split(' ')
+
+    if len(words) == 2:
+        remaining_spaces = max_length - text_length
+        return f'{words[0]}{" " * remaining_spaces}{words[1]}'
+
+    remaining_spaces = (max_length - text_length)
+
+    words = _legacy_fill_with_spaces(words, remaining_spaces)
+
+    return ' '.join(words)
+
+
+def _get_lines(width, copies):
+    with open(INPUT_FILE) as file:
+        text = file.read()
+
+    lines = utils._wrap_text(' '.join([text] * copies), width)
+    # Lines with a single word can not be justified by the legacy
+    # algorithm (it recurses forever), so they are left out.
+    return [line for line in lines if ' ' in line]
+
+
+def _measure(function, lines, width, repeat):
+    def run():
+        return [function(line, width) for line in lines]
+
+    try:
+        result = run()
+    except RecursionError:
+        return None, None
+
+    return min(timeit.repeat(run, number=1, repeat=repeat)), result
+
+
+def main(repeat):
+    print(f'{"text":>6} {"width":>6} {"lines":>6} {"legacy (s)":>12} '
+          f'{"justify (s)":>12} {"speedup":>8}')
+
+    for copies, width in itertools.product((1, 100), WIDTHS):
+        lines = _get_lines(width, copies)
+        legacy_time, legacy_result = \
+            _measure(legacy_justify, lines, width, repeat)
+        time, result = _measure(utils.justify, lines, width, repeat)
+
+        if legacy_result is None:
+            legacy, speedup = 'recursion', '-'
+        else:
+            assert result == legacy_result, f'Different output ({width})'
+            legacy, speedup = f'{legacy_time:.6f}', \
+                f'{legacy_time / time:.1f}x'
+
+        print(f'{copies:>5}x {width:>6} {len(lines):>6} {legacy:>12} '
+              f'{time:>12.6f} {speedup:>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+    main(parser.parse_args().repeat)
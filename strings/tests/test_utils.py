@@ -1,3 +1,6 @@
+import io
+import textwrap
+
 import pytest
 from textwrapper import utils
 
@@ -92,6 +95,42 @@ class TestGetFormattedText:
             'Max length can not be lower than 10.'
 
 
+class TestGetFormattedParagraphs:
+    text = 'First paragraph with some words.\n\n' \
+           'Second paragraph\nwith a line break.\n \n\n' \
+           'Third.\n\n'
+
+    def test_must_format_each_paragraph(self):
+        assert utils.get_formatted_text(self.text, 20, paragraphs=True) == \
+            'First paragraph with\nsome words.\n\n' \
+            'Second paragraph\nwith a line break.\n\n\n' \
+            'Third.'
+
+    def test_must_justify_each_paragraph(self):
+        text = utils.get_formatted_text(self.text, 20, True, True)
+
+        assert text.split('\n\n') == [
+            'First paragraph with\nsome         words.',
+            'Second    paragraph\nwith  a  line break.',
+            '\nThird.',
+        ]
+
+    def test_must_format_sample_input(self):
+        with open('input1.txt') as file:
+            text = file.read()
+        with open('output_parte1.txt') as file:
+            expected_text = file.read()
+
+        assert utils.get_formatted_text(text, 40, paragraphs=True) == \
+            expected_text.rstrip('\n')
+
+    def test_must_format_paragraphs_in_parallel(self):
+        text = self.text * 10
+
+        assert utils.get_formatted_text(text, 20, True, True, workers=2) == \
+            utils.get_formatted_text(text, 20, True, True)
+
+
 class TestCommandSurroundedByFrame:
     @pytest.mark.parametrize('max_length', (
         10, 20, 30
@@ -170,3 +209,110 @@ class TestJustify:
     ))
     def test_must_justify_text(self, text, max_length, expected_text):
         assert utils.justify(text, max_length) == expected_text
+
+    @pytest.mark.parametrize('text, max_length, expected_text', (
+        ('a b c d', 9, 'a  b  c d'),
+        ('a b c d', 10, 'a  b  c  d'),
+        ('a b c d', 11, 'a   b  c  d'),
+        ('a  b c', 8, 'a    b c'),
+    ))
+    def test_must_add_extra_spaces_from_left(
+            self, text, max_length, expected_text):
+        assert utils.justify(text, max_length) == expected_text
+
+    @pytest.mark.parametrize('text, max_length', (
+        ('God', 10),
+        ('God is', 6),
+        ('God is here', 11),
+    ))
+    def test_must_return_text_without_room(self, text, max_length):
+        assert utils.justify(text, max_length) == text
+
+    def test_must_justify_wide_lines(self):
+        text = utils.justify('God have not spoken', 100000)
+
+        assert len(text) == 100000
+        assert text.split() == ['God', 'have', 'not', 'spoken']
+
+
+class TestOpenTextFile:
+    def test_must_return_opened_file(self, mocker):
+        mocked_open = mocker.patch('builtins.open')
+
+        assert utils.open_text_file('fake_file') is \
+            mocked_open.return_value
+        assert mocker.call('fake_file') in mocked_open.call_args_list
+
+    def test_must_raise_custom_exception(self, mocker):
+        mocker.patch('builtins.open', side_effect=FileNotFoundError)
+        with pytest.raises(Exception) as ex:
+            utils.open_text_file('fake_file')
+
+        assert ex.value.args[0] == \
+            'Can not read "fake_file" file.'
+
+
+class TestIterFormattedLines:
+    text = 'In the beginning God created the heavens and the earth. ' \
+           'Now the earth was formless and empty,\tdarkness was over ' \
+           'the surface of the deep, and the Spirit of God was hovering ' \
+           'over the waters.\n\nAnd God said, "Let there be light," and ' \
+           'there was light. A well-known\tsupercalifragilisticexpiali' \
+           'docious-word\r\nends   here.'
+
+    @pytest.mark.parametrize('chunk_size', (1, 7, 64, 4096))
+    @pytest.mark.parametrize('max_length', (10, 17, 40))
+    def test_must_return_same_lines_as_textwrap(
+            self, chunk_size, max_length):
+        lines = utils.iter_formatted_lines(
+            io.StringIO(self.text), max_length, chunk_size=chunk_size)
+
+        assert list(lines) == textwrap.wrap(self.text, max_length)
+
+    def test_must_justify_lines(self):
+        text = self.text.split('A well-known')[0]
+        lines = utils.iter_formatted_lines(
+            io.StringIO(text), 40, True, chunk_size=16)
+
+        assert list(lines) == \
+            utils.get_formatted_text(text, 40, True).split('\n')
+
+    def test_must_yield_lines_before_reading_everything(self):
+        stream = io.StringIO('word ' * 1000)
+        lines = utils.iter_formatted_lines(stream, 10, chunk_size=20)
+
+        assert next(lines) == 'word word'
+        assert stream.tell() < 100
+
+    def test_must_raise_error_if_length_lower_10(self):
+        with pytest.raises(ValueError) as ex:
+            utils.iter_formatted_lines(io.StringIO('ugly text'), 9)
+
+        assert ex.value.args[0] == \
+            'Max length can not be lower than 10.'
+
+    @pytest.mark.parametrize('chunk_size', (1, 7, 4096))
+    def test_must_return_same_paragraphs_as_formatted_text(self, chunk_size):
+        text = '\n\n' + TestGetFormattedParagraphs.text
+        lines = utils.iter_formatted_lines(
+            io.StringIO(text), 20, True, chunk_size, paragraphs=True)
+
+        assert list(lines) == \
+            utils.get_formatted_text(text, 20, True, True).split('\n')
+
+    @pytest.mark.parametrize('chunk_size', (1, 9, 10, 64))
+    def test_must_not_split_words_at_non_breaking_spaces(self, chunk_size):
+        text = 'aaaa bbbb\xa0cccc dddd eeee'
+        lines = utils.iter_formatted_lines(
+            io.StringIO(text), 12, chunk_size=chunk_size)
+
+        assert list(lines) == ['aaaa', 'bbbb\xa0cccc', 'dddd eeee']
+
+    @pytest.mark.parametrize('chunk_size', (1, 2, 4096))
+    def test_must_split_paragraphs_ending_in_unicode_spaces(self, chunk_size):
+        text = 'aaaa\n\n\xa0\n\nbbbb　\n\n'
+        lines = utils.iter_formatted_lines(
+            io.StringIO(text), 12, chunk_size=chunk_size, paragraphs=True)
+
+        assert '\n'.join(lines) == \
+            utils.get_formatted_text(text, 12, paragraphs=True)
@@ -16,10 +16,17 @@ def command_group():
 @click.option('--max-length', default=40, help='Max line column length.')
 @click.option('--justify', '-j', default=False, multiple=True,
               is_flag=True, help='Justify text')
+@click.option('--paragraphs', '-p', default=False, is_flag=True,
+              help='Format each paragraph on its own')
+@click.option('--workers', '-w', default=1, type=click.IntRange(min=1),
+              help='Processes formatting paragraphs')
 @utils.command_surrounded_by_frame
 @utils.command_exception_handler
-def text_wrapper(text, max_length, justify):
-    print(utils.get_formatted_text(text, max_length, justify))
+def text_wrapper(text, max_length, justify, paragraphs, workers):
+    print(
+        utils.get_formatted_text(
+            text, max_length, justify, paragraphs, workers)
+    )
 
 
 @command_group.command(
@@ -30,14 +37,33 @@ def text_wrapper(text, max_length, justify):
 @click.option('--max-length', default=40, help='Max line column length.')
 @click.option('--justify', '-j', default=False, multiple=True,
               is_flag=True, help='Justify text')
+@click.option('--stream', '-s', default=False, is_flag=True,
+              help='Read and print lines incrementally')
+@click.option('--paragraphs', '-p', default=False, is_flag=True,
+              help='Format each paragraph on its own')
+@click.option('--workers', '-w', default=1, type=click.IntRange(min=1),
+              help='Processes formatting paragraphs, not with --stream')
 @utils.command_surrounded_by_frame
 @utils.command_exception_handler
-def file_wrapper(file_path, max_length, justify):
+def file_wrapper(file_path, max_length, justify, stream, paragraphs, workers):
+    if stream:
+        if workers > 1:
+            raise ValueError('Workers can not be used with stream.')
+
+        with utils.open_text_file(file_path) as file:
+            lines = utils.iter_formatted_lines(
+                file, max_length, justify, paragraphs=paragraphs)
+            for line in lines:
+                print(line)
+        return
+
     print(
         utils.get_formatted_text(
             utils.read_text_from_file(file_path),
             max_length,
-            justify)
+            justify,
+            paragraphs,
+            workers)
     )
 
 
@@ -1,5 +1,16 @@
+import concurrent.futures
+import functools
+import itertools
+import re
 import textwrap
 
+CHUNK_SIZE = 64 * 1024
+PARAGRAPH_SEPARATOR = re.compile(r'(\n(?:[ \t\r\f\v]*\n)+)')
+# Only these characters are whitespace to textwrap, unlike str.isspace()
+# and \s they do not include non-breaking and other Unicode spaces.
+WHITESPACE = frozenset('\t\n\x0b\x0c\r ')
+NON_WHITESPACE = re.compile(r'[^\t\n\x0b\x0c\r ]')
+
 
 def _wrap_text(text, max_length):
     """Wrap given text, splinting it into line with limited length.
@@ -14,6 +25,191 @@ def _wrap_text(text, max_length):
     return textwrap.wrap(text, max_length)
 
 
+def _find_last_whitespace_run(text):
+    """Find where the whitespace run before the last word starts.
+
+    :param text: Text to be searched
+    :type text: str
+    :return: Index of the run start or -1 if there is no whitespace
+    :rtype: int
+    """
+    index = len(text) - 1
+    while index >= 0 and text[index] not in WHITESPACE:
+        index -= 1
+
+    while index > 0 and text[index - 1] in WHITESPACE:
+        index -= 1
+
+    return index
+
+
+def _read_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Read a text stream in chunks.
+
+    :param stream: Text stream
+    :param chunk_size: Number of characters read at once
+    :type chunk_size: int
+    :return: Text chunks generator
+    :rtype: collections.abc.Iterator
+    """
+    return iter(lambda: stream.read(chunk_size), '')
+
+
+def _iter_paragraph_texts(texts):
+    """Split text fragments at paragraph separators (blank lines).
+
+    Yields text fragments of a paragraph and, between paragraphs, the
+    number of new lines of their separator. A separator is only yielded
+    once it is followed by text or by the end of the text, so it can span
+    several fragments.
+
+    :param texts: Text fragments iterable
+    :return: Generator of text fragments and separator sizes
+    :rtype: collections.abc.Iterator
+    """
+    buffer = ''
+    for text in itertools.chain(texts, [None]):
+        final = text is None
+        buffer += text or ''
+
+        start, end = 0, None
+        for match in PARAGRAPH_SEPARATOR.finditer(buffer):
+            if not final and not NON_WHITESPACE.search(buffer, match.end()):
+                end = match.start()
+                break
+
+            if match.start() > start:
+                yield buffer[start:match.start()]
+            yield match.group().count('\n')
+            start = match.end()
+
+        if final:
+            end = len(buffer)
+        elif end is None:
+            # Only the last line may be the beginning of a separator.
+            end = buffer.rfind('\n', start)
+            if end < 0 or NON_WHITESPACE.search(buffer, end):
+                end = len(buffer)
+
+        if end > start:
+            yield buffer[start:end]
+        buffer = buffer[end:]
+
+
+def _iter_chunks(texts, wrapper):
+    """Split text fragments into textwrap chunks.
+
+    Text is only split right before whitespace runs, so chunks are the
+    same textwrap gets from the whole text. Tabs are expanded keeping
+    track of the column, as textwrap does.
+
+    :param texts: Text fragments iterable
+    :param wrapper: Wrapper used to split chunks
+    :type wrapper: textwrap.TextWrapper
+    :return: Chunks generator
+    :rtype: collections.abc.Iterator
+    """
+    column = 0
+
+    def expand_tabs(text):
+        nonlocal column
+        padding = ' ' * column
+        text = (padding + text).expandtabs(wrapper.tabsize)[column:]
+        line_start = max(text.rfind('\n'), text.rfind('\r')) + 1
+        column = (column if not line_start else 0) + len(text) - line_start
+        column %= wrapper.tabsize
+        return text
+
+    buffer = ''
+    for text in texts:
+        buffer += text
+
+        index = _find_last_whitespace_run(buffer)
+        if index > 0:
+            yield from wrapper._split_chunks(expand_tabs(buffer[:index]))
+            buffer = buffer[index:]
+
+    if buffer:
+        yield from wrapper._split_chunks(expand_tabs(buffer))
+
+
+def _iter_wrapped_lines(chunks, wrapper):
+    """Greedily join chunks into lines as textwrap.wrap does.
+
+    Lines are yielded as soon as they are complete, keeping in memory only
+    the chunks of the current line.
+
+    :param chunks: Chunks iterable
+    :param wrapper: Wrapper used to handle long words
+    :type wrapper: textwrap.TextWrapper
+    :return: Lines generator
+    :rtype: collections.abc.Iterator
+    """
+    chunks = iter(chunks)
+    reversed_chunks = []
+    width = wrapper.width
+    has_lines = False
+
+    def peek():
+        if not reversed_chunks:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return None
+            reversed_chunks.append(chunk)
+        return reversed_chunks[-1]
+
+    while peek() is not None:
+        line, length = [], 0
+
+        if peek().strip() == '' and has_lines:
+            reversed_chunks.pop()
+
+        while peek() is not None and length + len(peek()) <= width:
+            line.append(reversed_chunks.pop())
+            length += len(line[-1])
+
+        if peek() is not None and len(peek()) > width:
+            wrapper._handle_long_word(reversed_chunks, line, length, width)
+
+        if line and line[-1].strip() == '':
+            del line[-1]
+
+        if line:
+            has_lines = True
+            yield ''.join(line)
+
+
+def _iter_paragraph_lines(texts, wrapper):
+    """Wrap each paragraph of text fragments on its own.
+
+    Paragraphs keep the number of blank lines between them.
+
+    :param texts: Text fragments iterable
+    :param wrapper: Wrapper used to split chunks
+    :type wrapper: textwrap.TextWrapper
+    :return: Lines generator
+    :rtype: collections.abc.Iterator
+    """
+    separator_size = 0
+    has_lines = False
+
+    items = itertools.groupby(
+        _iter_paragraph_texts(texts),
+        key=lambda item: isinstance(item, int),
+    )
+    for is_separator, group in items:
+        if is_separator:
+            separator_size = sum(group)
+            continue
+
+        lines = _iter_wrapped_lines(_iter_chunks(group, wrapper), wrapper)
+        for index, line in enumerate(lines):
+            if not index and has_lines:
+                yield from [''] * (separator_size - 1)
+            has_lines = True
+            yield line
+
+
 def _join_lines(lines):
     """Join lines into a single string
 
@@ -25,23 +221,13 @@ def _join_lines(lines):
     return '\n'.join(lines)
 
 
-def _fill_with_spaces(words, remaining_spaces):
-    if not remaining_spaces:
-        return words
-
-    for index in range(1, len(words)):
-        words[index] = words[index].rjust(len(words[index]) + 1)
-        remaining_spaces -= 1
-
-        if not remaining_spaces:
-            break
-
-    return _fill_with_spaces(words, remaining_spaces)
-
-
 def justify(text, max_length):
     """Add full justify to given text.
 
+    Missing spaces are spread over the gaps between words, the leftmost
+    gaps getting one extra space when they can not be evenly spread. A
+    line with two words gets only the missing spaces between them.
+
     :param text: Text to be justified
     :type text: str
     :param max_length: Max length of line
@@ -49,22 +235,23 @@ def justify(text, max_length):
     :return: Justified text
     :rtype: str
     """
-    text_length = len(text)
+    remaining_spaces = max_length - len(text)
+    words = text.split(' ')
+    gaps = len(words) - 1
 
-    if text_length == max_length:
+    if remaining_spaces <= 0 or not gaps:
         return text
 
-    words = text.split(' ')
-
-    if len(words) == 2:
-        remaining_spaces = max_length - text_length
+    if gaps == 1:
         return f'{words[0]}{" " * remaining_spaces}{words[1]}'
 
-    remaining_spaces = (max_length - text_length)
-
-    words = _fill_with_spaces(words, remaining_spaces)
+    spaces, extra_spaces = divmod(remaining_spaces, gaps)
+    narrow_gap = ' ' * (spaces + 1)
+    wide_gap = narrow_gap + ' '
 
-    return ' '.join(words)
+    return narrow_gap.join(
+        [wide_gap.join(words[:extra_spaces + 1])] + words[extra_spaces + 1:]
+    )
 
 
 def _justifier(max_length, justify_text):
@@ -84,7 +271,72 @@ def _justifier(max_length, justify_text):
     return inner
 
 
-def get_formatted_text(text, max_length, justify_text=False):
+def _format_paragraph(text, max_length, justify_text=False):
+    """Wrap and justify given text as a single paragraph.
+
+    :param text: Text to be wrapped
+    :type text: str
+    :param max_length: Max length of line
+    :type max_length: int
+    :param justify_text: If true text will be full justified.
+    :type justify_text: bool
+    :return: Formatted text
+    :rtype: str
+    """
+    lines = _wrap_text(text, max_length)
+
+    lines = map(_justifier(max_length, justify_text), lines)
+
+    return _join_lines(lines)
+
+
+def _format_paragraphs(text, max_length, justify_text=False, workers=1):
+    """Format each paragraph (text between blank lines) on its own.
+
+    Paragraphs keep the number of blank lines between them. With more
+    than one worker, paragraphs are formatted by a process pool.
+
+    :param text: Text to be wrapped
+    :type text: str
+    :param max_length: Max length of line
+    :type max_length: int
+    :param justify_text: If true text will be full justified.
+    :type justify_text: bool
+    :param workers: Number of processes.
+    :type workers: int
+    :return: Formatted text
+    :rtype: str
+    """
+    parts = PARAGRAPH_SEPARATOR.split(text)
+    paragraphs, separators = parts[::2], [''] + parts[1::2]
+
+    format_paragraph = functools.partial(
+        _format_paragraph, max_length=max_length, justify_text=justify_text
+    )
+
+    if workers > 1 and len(paragraphs) > 1:
+        chunk_size = max(1, len(paragraphs) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            paragraphs = list(
+                executor.map(format_paragraph, paragraphs,
+                             chunksize=chunk_size)
+            )
+    else:
+        paragraphs = list(map(format_paragraph, paragraphs))
+
+    formatted = []
+    for paragraph, separator in zip(paragraphs, separators):
+        if not paragraph:
+            continue
+        if formatted:
+            formatted.append('\n' * separator.count('\n'))
+        formatted.append(paragraph)
+
+    return ''.join(formatted)
+
+
+def get_formatted_text(text, max_length, justify_text=False,
+                       paragraphs=False, workers=1):
     """Return formatted text.
 
     :param text: Text to be wrapped
@@ -93,6 +345,10 @@ def get_formatted_text(text, max_length, justify_text=False):
     :type max_length: int
     :param justify_text: If true text will be full justified.
     :type justify_text: bool
+    :param paragraphs: If true paragraphs are formatted on their own.
+    :type paragraphs: bool
+    :param workers: Number of processes formatting paragraphs.
+    :type workers: int
     :raise ValueError
     :return: Formatted text
     :rtype: str
@@ -100,11 +356,45 @@ def get_formatted_text(text, max_length, justify_text=False):
     if max_length < 10:
         raise ValueError('Max length can not be lower than 10.')
 
-    lines = _wrap_text(text, max_length)
+    if paragraphs:
+        return _format_paragraphs(text, max_length, justify_text, workers)
 
-    lines = map(_justifier(max_length, justify_text), lines)
+    return _format_paragraph(text, max_length, justify_text)
 
-    return _join_lines(lines)
+
+def iter_formatted_lines(stream, max_length, justify_text=False,
+                         chunk_size=CHUNK_SIZE, paragraphs=False):
+    """Return formatted lines of a text stream as they are produced.
+
+    Lines are the same get_formatted_text returns for the whole text, but
+    memory is bounded by the line and chunk sizes instead of the text
+    size.
+
+    :param stream: Text stream, like an opened file
+    :param max_length: Max length of line
+    :type max_length: int
+    :param justify_text: If true text will be full justified.
+    :type justify_text: bool
+    :param chunk_size: Number of characters read at once
+    :type chunk_size: int
+    :param paragraphs: If true paragraphs are formatted on their own.
+    :type paragraphs: bool
+    :raise ValueError
+    :return: Formatted lines generator
+    :rtype: collections.abc.Iterator
+    """
+    if max_length < 10:
+        raise ValueError('Max length can not be lower than 10.')
+
+    wrapper = textwrap.TextWrapper(max_length)
+    texts = _read_chunks(stream, chunk_size)
+
+    if paragraphs:
+        lines = _iter_paragraph_lines(texts, wrapper)
+    else:
+        lines = _iter_wrapped_lines(_iter_chunks(texts, wrapper), wrapper)
+
+    return map(_justifier(max_length, justify_text), lines)
 
 
 def command_surrounded_by_frame(func):
@@ -140,6 +430,22 @@ def command_exception_handler(func):
     return inner
 
 
+def open_text_file(file_path):
+    """Open file to be read as a stream.
+
+    :param file_path: File path
+    :type file_path: str
+    :raises Exception
+    :return: Opened file
+    """
+    try:
+        return open(file_path)
+    except Exception:
+        raise Exception(
+            f'Can not read "{file_path}" file.'
+        ) from None
+
+
 def read_text_from_file(file_path):
     """Read content from file.
 